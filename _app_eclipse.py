@@ -13,8 +13,8 @@ from dragonfly import (
 )
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Key  # @Reimport
     from proxy_nicknames import AppContext as NixAppContext
 
@@ -70,7 +70,7 @@ context = None
 winContext1 = AppContext(executable="javaw", title="Eclipse")
 winContext2 = AppContext(executable="eclipse", title="Eclipse")
 winContext = winContext1 | winContext2
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     nixContext = NixAppContext(executable="java", title="Eclipse")
     context = winContext | nixContext
 else:
@@ -8,6 +8,14 @@ modules is incompatible with.
 
 Other features that can be enabled/disabled are Aenea, the client-server
 connection to Linux. Note that a reload is required after changing Aenea state.
+Each grammar module picks its Key and Text action classes and its context when
+it is imported, and builds its rules from them, and lib.text picks the base
+class of SCText and NTText the same way, so switching would mean rebuilding
+every rule. The new state is saved right away, and a subscriber announces that
+a reload is needed, also when aenea.enabled is changed in config.json.
+
+Changes to the dynamic module states in config.json are applied without a
+reload, at the start of the next utterance.
 
 -----------------------------------------------------------------------------
 Licensed under LGPL3
@@ -29,8 +37,8 @@ from dragonfly import (
 )
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     import aenea
 
 import lib.sound as sound
@@ -83,9 +91,7 @@ def enable_module(module, useSound=True):
     status = module.dynamic_enable()
     if status:
         notify_module_enabled(moduleName, useSound)
-        config = lib.config.get_config()
-        config["dynamics.%s" % moduleName] = True
-        lib.config.save_config()
+        lib.config.set_value("dynamics.%s" % moduleName, True)
     else:
         notify_module_action_aborted("Dynamic grammar %s already enabled." %
             moduleName)
@@ -99,9 +105,7 @@ def disable_module(module, useSound=True):
     moduleName = module.DYN_MODULE_NAME
     if status:
         notify_module_disabled(moduleName, useSound)
-        config = lib.config.get_config()
-        config["dynamics.%s" % moduleName] = False
-        lib.config.save_config()
+        lib.config.set_value("dynamics.%s" % moduleName, False)
 
 
 def disable_incompatible_modules(enableModule):
@@ -137,34 +141,52 @@ def disable_all_modules():
     """Iterates through the list of all dynamic modules and disables them."""
     global moduleMapping
     disableCount = 0
-    config = lib.config.get_config()
     for moduleName, module in moduleMapping.items():
         status = module.dynamic_disable()
         if status:
             disableCount += 1
-            config["dynamics.%s" % moduleName] = False
+            lib.config.set_value("dynamics.%s" % moduleName, False)
             notify_module_disabled(moduleName, useSound=False)
     if disableCount > 0:
         sound.play(sound.SND_DEACTIVATE)
-        lib.config.save_config()
     print("----------- All dynamic modules disabled -----------\n")
 
 
+def apply_config_change(name, oldValue, newValue):  # @UnusedVariable
+    """Config subscriber, enables or disables a dynamic module when its state
+    in the config changes, e.g. when config.json has been edited.
+
+    """
+    global moduleMapping
+    if not name.startswith("dynamics."):
+        return
+    module = moduleMapping.get(name[len("dynamics."):])
+    if not module or module.grammar.enabled == bool(newValue):
+        return  # Unknown module, or already in the requested state.
+    if newValue:
+        enable_module(module)
+    else:
+        disable_module(module)
+
+
 def enable_aenea():
-    config = lib.config.get_config()
-    if config.get("aenea.enabled", False) == False:
-        config["aenea.enabled"] = True
-        lib.config.save_config()
-        print("<<< Aenea enabled, reload required. >>>")
-        print("<<< Don't forget, start the server and the client window. >>>")
+    lib.config.set_value("aenea.enabled", True)
 
 
 def disable_aenea():
-    config = lib.config.get_config()
-    if config.get("aenea.enabled", False) == True:
-        config["aenea.enabled"] = False
-        lib.config.save_config()
-        print("<<< Aenea disabled. >>>")
+    lib.config.set_value("aenea.enabled", False)
+
+
+def notify_aenea_changed(name, oldValue, newValue):  # @UnusedVariable
+    """Config subscriber, announces a change of the Aenea state, which only
+    takes effect after a reload, see the module docstring.
+
+    """
+    if newValue:
+        print("<<< Aenea enabled, reload required. >>>")
+        print("<<< Don't forget, start the server and the client window. >>>")
+    else:
+        print("<<< Aenea disabled, reload required. >>>")
 
 
 class SeriesMappingRule(CompoundRule):
@@ -206,11 +228,23 @@ series_rule = SeriesMappingRule(
 )
 
 context = None
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     context = aenea.global_context
-grammar = Grammar("Dynamic manager", context=context)
+class DynamicManagerGrammar(Grammar):
+    def process_begin(self, executable, title, handle):  # @UnusedVariable
+        """Applies any config changes picked up by the config watcher. Runs
+        on the engine's thread, which is required for enabling grammars.
+
+        """
+        lib.config.apply_pending_changes()
+
+
+grammar = DynamicManagerGrammar("Dynamic manager", context=context)
 grammar.add_rule(series_rule)
 grammar.load()
+lib.config.subscribe(None, apply_config_change)
+lib.config.subscribe("aenea.enabled", notify_aenea_changed)
+lib.config.watch_config()
 
 
 notify()  # Notify that Dragonfly is ready with a sound.
@@ -227,3 +261,8 @@ def unload():
     if grammar:
         grammar.unload()
     grammar = None
+
+    lib.config.unsubscribe(None, apply_config_change)
+    lib.config.unsubscribe("aenea.enabled", notify_aenea_changed)
+    lib.config.stop_watching()
+    lib.config.flush_config()  # Write any pending config changes.
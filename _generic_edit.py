@@ -34,8 +34,8 @@ from dragonfly.actions.typeables import typeables
 typeables["Control_R"] = Typeable(code=win32con.VK_RCONTROL, name="Control_R")
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Key, Text  # @Reimport
     import aenea
 
@@ -117,6 +117,19 @@ modifierMap = {
     "super": "w",
 }
 
+# Spoken forms of the lib.format styles.
+formatStyleMap = {
+    "camel case": "camel",
+    "pascal case": "pascal",
+    "snake case": "snake",
+    "squash": "squash",
+    "kebab case": "kebab",
+    "dotted": "dotted",
+    "constant case": "constant",
+    "uppercase": "upper",
+    "lowercase": "lower",
+}
+
 # Modifiers for the press-command, if only the modifier is pressed.
 singleModifierMap = {
     "alt": "alt",
@@ -259,19 +272,13 @@ grammarCfg.cmd.map = Item(
         # To release keyboard capture by VirtualBox.
         "press right control": Key("Control_R"),
          # Formatting.
-        "camel case <text>": Function(lib.format.camel_case_text),
-        "camel case <n> [words]": Function(lib.format.camel_case_count),
-        "pascal case <text>": Function(lib.format.pascal_case_text),
-        "pascal case <n> [words]": Function(lib.format.pascal_case_count),
-        "snake case <text>": Function(lib.format.snake_case_text),
-        "snake case <n> [words]": Function(lib.format.snake_case_count),
-        "squash <text>": Function(lib.format.squash_text),
-        "squash <n> [words]": Function(lib.format.squash_count),
+        "<style> <text>": Function(lib.format.format_text),
+        "<style> <n> [words]": Function(lib.format.format_count),
         "expand <n> [words]": Function(lib.format.expand_count),
-        "uppercase <text>": Function(lib.format.uppercase_text),
-        "uppercase <n> [words]": Function(lib.format.uppercase_count),
-        "lowercase <text>": Function(lib.format.lowercase_text),
-        "lowercase <n> [words]": Function(lib.format.lowercase_count),
+        "<style> selection": Function(lib.format.format_selection),
+        "<style> whole line": Function(lib.format.format_selection, line=True),  # @IgnorePep8
+        "expand selection": Function(lib.format.expand_selection),
+        "expand whole line": Function(lib.format.expand_selection, line=True),
         # Text corrections.
         "(add|fix) missing space": Key("c-left/3, space, c-right/3"),
         "(delete|remove) (double|extra) (space|whitespace)": Key("c-left/3, backspace, c-right/3"),  # @IgnorePep8
@@ -292,7 +299,7 @@ grammarCfg.cmd.map = Item(
 )
 
 
-if config.get("aenea.enabled") == True:
+if settings.aenea_enabled:
     # Keypresses, to get that working better in Linux.
     grammarCfg.cmd.map.update({
         "press <modifierSingle>": Key("%(modifierSingle)s"),
@@ -313,6 +320,7 @@ class KeystrokeRule(MappingRule):
         Choice("modifier2", modifierMap),
         Choice("modifierSingle", singleModifierMap),
         Choice("pressKey", pressKeyMap),
+        Choice("style", formatStyleMap),
     ]
     defaults = {
         "n": 1,
@@ -347,7 +355,7 @@ class RepeatRule(CompoundRule):
         release.execute()
 
 context = None
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     context = aenea.global_context
 grammar = Grammar("Generic edit", context=context)
 grammar.add_rule(RepeatRule())  # Add the top-level rule.
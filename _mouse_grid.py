@@ -32,7 +32,8 @@ from lib.grid_base import (
     go,
     mouse_grid,
     hide_grids,
-    mouse_pos
+    mouse_pos,
+    unload as unload_grids
 )
 
 
@@ -117,8 +118,6 @@ grammar2.load()  # Load the grammar.
 
 def unload():
     """Unload function which will be called at unload time."""
-#     global MONITORS
-#     global GRID_WINDOWS
     global grammar1
     if grammar1:
         grammar1.unload()
@@ -127,10 +126,7 @@ def unload():
     if grammar2:
         grammar2.unload()
     grammar2 = None
-#     for win in GRID_WINDOWS.values():
-#         win.destroy()
-#         win = None
-#     MONITORS = None
+    unload_grids()  # Destroys the grid windows, ends their UI thread.
 
 
 # # ----------------------------------------------------------------------------
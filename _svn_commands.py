@@ -12,8 +12,8 @@ from dragonfly import (
 )
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Key, Text  # @Reimport
     import aenea
 
@@ -100,7 +100,7 @@ series_rule = SeriesMappingRule(
 )
 
 context = None
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     context = aenea.global_context
 grammar = Grammar("Subversion commands", context=context)
 grammar.add_rule(series_rule)
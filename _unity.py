@@ -8,8 +8,8 @@ Licensed under LGPL3
 
 """
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     print("Loading Unity grammar...")
 
     from dragonfly import (
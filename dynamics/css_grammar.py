@@ -9,8 +9,8 @@ from dragonfly import (
 )
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Key, Text  # @Reimport
     import aenea
 
@@ -266,7 +266,7 @@ rules = MappingRule(
 )
 
 context = None
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     context = aenea.global_context
 grammar = Grammar("Css grammar", context=context)
 grammar.add_rule(rules)
@@ -10,8 +10,8 @@ from dragonfly import (
 )
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Key, Text  # @Reimport
     import aenea
 
@@ -277,12 +277,6 @@ def end_tag(element):
     Text("</%s>" % str(element)).execute()
 
 
-def attribute_with_content(attribute, text):
-    Text(' %(attribute)s=""').execute()
-    Key("left").execute()
-    SCText(str(text)).execute()
-
-
 rules = MappingRule(
     mapping={
         # Commands and keywords.
@@ -293,7 +287,7 @@ rules = MappingRule(
         "end tag": Text("</>") + Key("left"),
         "end tag <element>": Function(end_tag),
         "attribute <attribute>": Text(' %(attribute)s=""') + Key("left"),
-        "attribute <attribute> [equals] <text>": Function(attribute_with_content),  # @IgnorePep8
+        "attribute <attribute> [equals] <text>": SCText(' %(attribute)s="%(text)s"') + Key("left"),  # @IgnorePep8
         # Comments.
         "comment": Text("<!--  -->") + Key("left:4"),
         "comment <text>": SCText("<!-- %(text)s -->") + Key("left:4"),
@@ -334,7 +328,7 @@ rules = MappingRule(
 )
 
 context = None
-if config.get("aenea.enabled", False) == True:
+if settings.aenea_enabled:
     context = aenea.global_context
 grammar = Grammar("Html grammar", context=context)
 grammar.add_rule(rules)
@@ -0,0 +1,425 @@
+"""A support module for Dragonfly command modules, giving lib.text and
+lib.format access to the keyboard and the clipboard through a backend.
+
+DragonflyBackend does the real work through Dragonfly, and is used whenever
+Dragonfly can be imported. RecordingBackend only records what would have been
+typed, pressed and copied, and keeps an in-memory clipboard, so the text and
+format functions can run without Windows, e.g. in the lib.replay harness.
+Use set_backend() to switch.
+
+get_text_access() returns an object reading and replacing the text left of
+the caret without the clipboard, or None when the focused control does not
+allow it. DragonflyBackend supports the standard Windows edit and rich edit
+controls, through window messages.
+
+-----------------------------------------------------------------------------
+Licensed under LGPL3
+
+"""
+import sys
+import time
+
+
+class DragonflyBackend(object):
+    """Sends keyboard events and uses the clipboard through Dragonfly."""
+    def __init__(self):
+        from dragonfly import Text, Key, Clipboard, Window
+        from dragonfly.actions.keyboard import Keyboard
+        self._Text = Text
+        self._Key = Key
+        self._Clipboard = Clipboard
+        self._Window = Window
+        self._keyboard = Keyboard()
+        self._typeables = {}  # Character to typeable.
+
+    def get_typeable(self, character):
+        """Returns the typeable for a character, memoized."""
+        typeable = self._typeables.get(character)
+        if typeable is None:
+            typeable = self._keyboard.get_typeable(character)
+            self._typeables[character] = typeable
+        return typeable
+
+    def send_events(self, events):
+        self._keyboard.send_keyboard_events(events)
+
+    def type_text(self, text):
+        """Types text as it is, without any format processing."""
+        self._Text(text, static=True).execute()
+
+    def press(self, spec):
+        """Executes a Dragonfly Key spec, e.g. "c-v"."""
+        self._Key(spec).execute()
+
+    def pause(self, seconds):
+        time.sleep(seconds)
+
+    def get_clipboard_text(self):
+        return self._Clipboard().get_system_text()
+
+    def set_clipboard_text(self, text):
+        clipboard = self._Clipboard()
+        clipboard.set_text(text)
+        clipboard.copy_to_system()
+
+    def get_clipboard_sequence(self):
+        """Returns a number that changes whenever the clipboard changes, or
+        None if the system can't tell.
+
+        """
+        if sys.platform != "win32":
+            return None
+        import ctypes
+        return ctypes.windll.user32.GetClipboardSequenceNumber()
+
+    def save_clipboard(self):
+        """Returns all the clipboard contents, for restore_clipboard(), or
+        only the text if some format can't be read.
+
+        """
+        try:
+            return self._Clipboard(from_system=True)
+        except Exception as e:
+            print("Could not save the clipboard formats: %s" % str(e))
+            return self._Clipboard(text=self.get_clipboard_text())
+
+    def restore_clipboard(self, saved):
+        """Restores the contents from save_clipboard(), or only their text if
+        some format can't be written. Never raises, as it is called when
+        done with the clipboard, from finally blocks.
+
+        """
+        try:
+            saved.copy_to_system()
+        except Exception as e:
+            print("Could not restore the clipboard formats: %s" % str(e))
+            try:
+                self.set_clipboard_text(saved.get_text() or "")
+            except Exception as e:
+                print("Could not restore the clipboard text: %s" % str(e))
+
+    def get_foreground_executable(self):
+        return self._Window.get_foreground().executable
+
+    def get_text_access(self):
+        """Returns an EditControlAccess for the focused control, or None."""
+        if sys.platform != "win32":
+            return None
+        return EditControlAccess.for_focused_control()
+
+
+class EditControlAccess(object):
+    """Reads and replaces text in a standard edit control, through window
+    messages, so neither the clipboard nor the keyboard is used.
+
+    Selections are reported in 16 bits by EM_GETSEL, so controls holding
+    more text than that are left to the clipboard. So are rich edit
+    controls, which count a paragraph break as one character in selections
+    but as CR LF in WM_GETTEXT. Unlike WM_GETTEXT, the messages that read
+    their text with matching positions are not marshalled to other processes.
+
+    """
+    CLASS_NAMES = ("edit", "tedit", "tmemo")
+    WM_GETTEXT = 0x000D
+    WM_GETTEXTLENGTH = 0x000E
+    EM_GETSEL = 0x00B0
+    EM_SETSEL = 0x00B1
+    EM_REPLACESEL = 0x00C2
+    SMTO_ABORTIFHUNG = 0x0002
+    TIMEOUT = 100  # Milliseconds, per message.
+    MAX_LENGTH = 0xFFFF
+
+    _user32 = None
+    _GuiThreadInfo = None
+
+    def __init__(self, hwnd):
+        self._hwnd = hwnd
+
+    @classmethod
+    def for_focused_control(cls):
+        """Returns an EditControlAccess for the control with keyboard focus,
+        or None if it is not an edit control.
+
+        """
+        import ctypes
+        from ctypes import wintypes
+        if cls._user32 is None:
+            class GuiThreadInfo(ctypes.Structure):
+                _fields_ = [("cbSize", wintypes.DWORD),
+                            ("flags", wintypes.DWORD),
+                            ("hwndActive", wintypes.HWND),
+                            ("hwndFocus", wintypes.HWND),
+                            ("hwndCapture", wintypes.HWND),
+                            ("hwndMenuOwner", wintypes.HWND),
+                            ("hwndMoveSize", wintypes.HWND),
+                            ("hwndCaret", wintypes.HWND),
+                            ("rcCaret", wintypes.RECT)]
+            cls._GuiThreadInfo = GuiThreadInfo
+            user32 = ctypes.windll.user32
+            user32.GetForegroundWindow.restype = wintypes.HWND
+            user32.SendMessageTimeoutW.argtypes = [wintypes.HWND,
+                wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM,
+                wintypes.UINT, wintypes.UINT, ctypes.POINTER(ctypes.c_size_t)]
+            cls._user32 = user32
+        user32 = cls._user32
+        threadId = user32.GetWindowThreadProcessId(
+            user32.GetForegroundWindow(), None)
+        info = cls._GuiThreadInfo()
+        info.cbSize = ctypes.sizeof(info)
+        if not threadId or not user32.GetGUIThreadInfo(threadId,
+                ctypes.byref(info)) or not info.hwndFocus:
+            return None
+        className = ctypes.create_unicode_buffer(64)
+        user32.GetClassNameW(info.hwndFocus, className, 64)
+        if className.value.lower() not in cls.CLASS_NAMES:
+            return None
+        return cls(info.hwndFocus)
+
+    def _send(self, message, wParam, lParam):
+        """Sends a message, returns its result, or None on a timeout."""
+        import ctypes
+        result = ctypes.c_size_t()
+        if not self._user32.SendMessageTimeoutW(self._hwnd, message, wParam,
+                lParam, self.SMTO_ABORTIFHUNG, self.TIMEOUT,
+                ctypes.byref(result)):
+            return None
+        return result.value
+
+    def get_text_before_caret(self):
+        """Returns (text, caret), text being all the text in the control.
+        Returns None if the text can't be read, or if text is selected.
+
+        """
+        import ctypes
+        length = self._send(self.WM_GETTEXTLENGTH, 0, 0)
+        if length is None or length > self.MAX_LENGTH:
+            return None
+        selection = self._send(self.EM_GETSEL, 0, 0)
+        if selection is None:
+            return None
+        (start, end) = (selection & 0xFFFF, (selection >> 16) & 0xFFFF)
+        if start != end:
+            return None
+        buffer = ctypes.create_unicode_buffer(length + 1)
+        if self._send(self.WM_GETTEXT, length + 1,
+                ctypes.addressof(buffer)) is None:
+            return None
+        return (buffer.value, end)
+
+    def replace(self, start, end, text):
+        """Replaces the text between start and end. Returns False if the
+        control did not respond.
+
+        """
+        import ctypes
+        if isinstance(text, str):
+            text = text.decode("mbcs")
+        buffer = ctypes.create_unicode_buffer(text)
+        if self._send(self.EM_SETSEL, start, end) is None:
+            return False
+        return self._send(self.EM_REPLACESEL, 1,  # Can be undone.
+            ctypes.addressof(buffer)) is not None
+
+
+class RecordedTextAccess(object):
+    """Text access of RecordingBackend, working on its editorText."""
+    def __init__(self, backend):
+        self._backend = backend
+
+    def get_text_before_caret(self):
+        backend = self._backend
+        if backend.anchor != backend.caret:
+            return None  # Text is selected.
+        return (backend.editorText, backend.caret)
+
+    def replace(self, start, end, text):
+        backend = self._backend
+        backend.editorText = backend.editorText[:start] + text + \
+            backend.editorText[end:]
+        backend.caret = backend.anchor = start + len(text)
+        backend.log.append(("replace", text))
+        return True
+
+
+class RecordedTypeable(object):
+    """Typeable of RecordingBackend, its events are (character, down, pause)
+    tuples.
+
+    """
+    __slots__ = ["character"]
+
+    def __init__(self, character):
+        self.character = character
+
+    def events(self, pause):
+        return ((self.character, True, pause),
+                (self.character, False, pause))
+
+
+class RecordingBackend(object):
+    """Records everything instead of sending it.
+
+    log is a list of ("type", text), ("key", spec), ("clipboard", text) and
+    ("replace", text) tuples, with consecutive typing merged into one entry.
+
+    If editorText is given, it is the text of an editor, with the caret at
+    the end. Typed text is inserted there, and the keys used by lib.format
+    move the caret and the selection, and cut, copy and paste through the
+    clipboard, like in an edit control: ctrl and shift held down, left,
+    home, s-end, c-x, c-c and c-v. Other keys are only recorded. The editor
+    allows text access, unless textAccess is False, which leaves the
+    clipboard as the only way to read its text.
+
+    """
+    def __init__(self, clipboardText="", executable="", editorText=None,
+                 textAccess=True):
+        self.log = []
+        self.clipboardText = clipboardText
+        self.clipboardSequence = 0
+        self.executable = executable
+        self.editorText = editorText
+        self.textAccess = textAccess
+        self.caret = len(editorText or "")
+        self.anchor = self.caret  # The other end of the selection.
+        self._heldKeys = set()
+        self._typeables = {}
+
+    def get_typeable(self, character):
+        typeable = self._typeables.get(character)
+        if typeable is None:
+            typeable = RecordedTypeable(character)
+            self._typeables[character] = typeable
+        return typeable
+
+    def send_events(self, events):
+        self._record_typing("".join([event[0] for event in events if
+            event[1]]))
+
+    def type_text(self, text):
+        self._record_typing(text)
+
+    def _record_typing(self, text):
+        if self.log and self.log[-1][0] == "type":
+            self.log[-1] = ("type", self.log[-1][1] + text)
+        else:
+            self.log.append(("type", text))
+        if self.editorText is not None:
+            self._insert(text)
+
+    def press(self, spec):
+        self.log.append(("key", spec))
+        if self.editorText is not None:
+            for key in spec.split(","):
+                self._press_key(key.strip().split("/")[0])
+
+    def _press_key(self, key):
+        """Applies a single key of a Dragonfly Key spec to the editor."""
+        (name, _, argument) = key.partition(":")
+        modifiers = set(self._heldKeys)
+        if len(name) > 2 and name[1] == "-":  # E.g. "s-end".
+            modifiers.add({"c": "ctrl", "s": "shift", "a": "alt"}.get(
+                name[0]))
+            name = name[2:]
+        if argument in ("down", "up"):
+            if argument == "down":
+                self._heldKeys.add(name)
+            else:
+                self._heldKeys.discard(name)
+            return
+        repeat = int(argument or 1)
+        text = self.editorText
+        (start, end) = sorted((self.anchor, self.caret))
+        if "ctrl" in modifiers and name in ("x", "c"):
+            self._set_clipboard(text[start:end])
+            if name == "x":
+                self._insert("")
+        elif "ctrl" in modifiers and name == "v":
+            self._insert(self.clipboardText)
+        elif name in ("left", "home", "end"):
+            for i in range(repeat):  # @UnusedVariable
+                self.caret = self._move(name, "ctrl" in modifiers)
+            if not "shift" in modifiers:
+                self.anchor = self.caret
+
+    def _move(self, name, byWord):
+        """Returns the caret position after pressing the named key."""
+        (text, position) = (self.editorText, self.caret)
+        if name == "home":
+            return text.rfind("\n", 0, position) + 1
+        if name == "end":
+            lineEnd = text.find("\n", position)
+            if lineEnd == -1:
+                return len(text)
+            return lineEnd
+        if not byWord:
+            return max(position - 1, 0)
+        while position > 0 and text[position - 1].isspace():
+            position -= 1
+        while position > 0 and not text[position - 1].isspace():
+            position -= 1
+        return position
+
+    def _insert(self, text):
+        """Replaces the selection in the editor with text."""
+        (start, end) = sorted((self.anchor, self.caret))
+        self.editorText = self.editorText[:start] + text + \
+            self.editorText[end:]
+        self.caret = self.anchor = start + len(text)
+
+    def pause(self, seconds):
+        pass
+
+    def get_clipboard_text(self):
+        return self.clipboardText
+
+    def set_clipboard_text(self, text):
+        self._set_clipboard(text)
+        self.log.append(("clipboard", text))
+
+    def _set_clipboard(self, text):
+        """Sets the clipboard, like the application does when cutting."""
+        self.clipboardText = text
+        self.clipboardSequence += 1
+
+    def get_clipboard_sequence(self):
+        return self.clipboardSequence
+
+    def save_clipboard(self):
+        return self.clipboardText
+
+    def restore_clipboard(self, saved):
+        self.set_clipboard_text(saved)
+
+    def get_foreground_executable(self):
+        return self.executable
+
+    def get_text_access(self):
+        if self.editorText is None or not self.textAccess:
+            return None
+        return RecordedTextAccess(self)
+
+    def get_typed_text(self):
+        """Returns everything typed, joined together."""
+        return "".join([entry[1] for entry in self.log if entry[0] == "type"])
+
+
+def get_backend():
+    global BACKEND
+    return BACKEND
+
+
+def set_backend(backend):
+    """Sets the backend used by lib.text and lib.format. Returns the previous
+    one.
+
+    """
+    global BACKEND
+    previous = BACKEND
+    BACKEND = backend
+    return previous
+
+
+try:
+    BACKEND = DragonflyBackend()
+except ImportError:  # No Dragonfly, e.g. on Linux.
+    BACKEND = RecordingBackend()
@@ -13,67 +13,451 @@ Example config:
 {
     "aenea.enabled": false,
     "aenea.path": null,  // Set path if Aenea is outside MacroSystem dir.
-    "dynamics.bash.enabled": true,
-    "dynamics.css.enabled": false,
-    "dynamics.git.enabled": false,
-    "dynamics.html.enabled": false,
-    "dynamics.javascript.enabled": false,
-    "dynamics.python.enabled": false,
+    "config.version": 1,
+    "cut_timeout.notepad.exe": 0.1,  // Learned by lib.format.
+    "dynamics.bash": true,
+    "dynamics.css": false,
+    "dynamics.git": false,
+    "dynamics.html": false,
+    "dynamics.javascript": false,
+    "dynamics.python": false,
     "system.base_path": "C:\\Natlink\\Natlink\\MacroSystem"
 }
 
 If you want to set a value like a path, you have to do that manually in the
 json file.
 
+The known values, their types and default values are declared in SCHEMA. A
+loaded config is migrated from older versions (see MIGRATIONS), validated and
+completed with default values. The result is cached in a marshal snapshot
+next to config.json, which is used instead of the json file on the next
+start, as long as config.json has not been modified since, and neither
+CONFIG_VERSION nor SCHEMA has changed.
+
+Saving is write-behind: save_config() only marks the config as changed, and a
+background thread writes the file once no more changes have arrived for
+SAVE_DELAY seconds. Several mode switches in one utterance therefore result in
+a single write, done off the recognition thread. Call flush_config() to write
+any pending changes immediately, e.g. at unload time.
+
+Values should be changed through set_value(), which saves the config and
+notifies any callbacks registered with subscribe() for that name. Values that
+are read in hot paths are also available as plain attributes on the object
+returned by get_settings(), e.g. get_settings().aenea_enabled, which are kept
+up to date on every change.
+
+Changes made to config.json by hand are picked up without a reload:
+watch_config() starts a background thread that polls the file's modification
+time and parses it when it changes. The differences are applied, and the
+subscribers notified, by apply_pending_changes(), which must be called from
+the thread that owns the grammars (the dynamic manager does this at the start
+of every utterance).
+
 """
 import os
 import sys
 import json
+import marshal
+import hashlib
+import time
+import atexit
+import threading
+from timeit import default_timer
+
+import lib.importpath
 
 WORKING_PATH = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
 CONFIG_PATH = os.path.join(WORKING_PATH, "config.json")
+SNAPSHOT_PATH = os.path.join(WORKING_PATH, "config.snapshot")
 CONFIG = {}  # Empty, default config.
+CONFIG_VERSION = 1
+# Config name to (type, default value). A name ending with a period applies
+# to every name starting with it, and its default value is not filled in.
+# The type can be a tuple of types, like for isinstance().
+SCHEMA = {
+    "config.version": (int, CONFIG_VERSION),
+    "cut_timeout.": ((int, float), 0.5),  # A hand written 1 is fine too.
+    "aenea.enabled": (bool, False),
+    "aenea.path": (basestring, None),
+    "dynamics.": (bool, False),
+    "format.paste_threshold": (int, 10),
+    "text.bulk_threshold": (int, 40),
+}
+# Snapshots taken with another schema are not trusted, their values were
+# validated and completed against it.
+SCHEMA_DIGEST = hashlib.md5(repr(sorted(SCHEMA.items()))).hexdigest()
+SAVE_DELAY = 0.5  # Seconds without changes before the config is written.
+
+_saveCondition = threading.Condition()
+_writeLock = threading.Lock()
+_saveThread = None
+_lastChange = None  # Time of the latest unsaved change, None if saved.
+_subscribers = {}  # Config name, or None for all names, to callback list.
+WATCH_INTERVAL = 1.0  # Seconds between checks for changes to config.json.
+
+_watchThread = None
+_watchStop = threading.Event()
+_knownMtime = None  # Modification time of config.json when last read/written.
+_pendingConfig = None  # Config parsed by the watcher, not yet applied.
+
+
+class Settings(object):
+    """Typed, cached attribute access to frequently read config values.
+
+    The attributes are refreshed by set_value() and load_config(), so
+    reading one is a plain attribute lookup instead of a dict lookup and
+    comparison.
+
+    """
+    # Config name to attribute name. Types and defaults are from SCHEMA.
+    ATTRIBUTES = {
+        "aenea.enabled": "aenea_enabled",
+        "aenea.path": "aenea_path",
+        "format.paste_threshold": "format_paste_threshold",
+        "text.bulk_threshold": "text_bulk_threshold",
+    }
+    __slots__ = ["aenea_enabled", "aenea_path", "format_paste_threshold",
+        "text_bulk_threshold"]
+
+    def __init__(self):
+        self.refresh()
+
+    def refresh(self, name=None):
+        """Reloads one attribute, or all attributes, from CONFIG."""
+        if name is None:
+            names = self.ATTRIBUTES.keys()
+        elif name in self.ATTRIBUTES:
+            names = [name]
+        else:
+            return
+        for name in names:
+            (valueType, default) = SCHEMA[name]
+            value = CONFIG.get(name, default)
+            if not isinstance(value, valueType):
+                value = default
+            setattr(self, self.ATTRIBUTES[name], value)
 
 
 def save_config():
+    """Schedules the config to be written to file, without blocking.
+
+    Changes made within SAVE_DELAY seconds of each other are coalesced into
+    one write, which is done by a background thread.
+
+    """
+    global _saveThread
+    global _lastChange
+    with _saveCondition:
+        _lastChange = time.time()
+        if _saveThread is None:
+            _saveThread = threading.Thread(target=_save_loop,
+                name="Config writer")
+            _saveThread.daemon = True
+            _saveThread.start()
+        _saveCondition.notify()
+
+
+def flush_config():
+    """Writes any pending config changes to file immediately."""
+    global _lastChange
+    with _writeLock:
+        with _saveCondition:
+            if _lastChange is None:
+                return
+            _lastChange = None
+        _write_config()
+
+
+def _save_loop():
+    """Background thread, writes the config once changes have settled."""
+    global _lastChange
+    while True:
+        with _saveCondition:
+            while _lastChange is None:
+                _saveCondition.wait()
+            remaining = _lastChange + SAVE_DELAY - time.time()
+            if remaining > 0:
+                _saveCondition.wait(remaining)  # More changes may arrive.
+                continue
+        flush_config()  # Written outside the lock, callers never wait.
+
+
+def _write_config():
+    """Writes the config to a temporary file, then replaces the config file
+    with it, so a crash half way through never leaves a truncated file.
+
+    """
     global CONFIG
     global CONFIG_PATH
+    global _knownMtime
+    tempPath = CONFIG_PATH + ".tmp"
     try:
-        configData = json.dumps(CONFIG, sort_keys=True, indent=4,
+        # One copy for both, a value set in between is in neither.
+        config = dict(CONFIG)
+        configData = json.dumps(config, sort_keys=True, indent=4,
             ensure_ascii=False)
-        with open(CONFIG_PATH, "w+") as f:
+        with open(tempPath, "w") as f:
             f.write(configData)  # Save config to file.
+            f.flush()
+            os.fsync(f.fileno())
+        _replace_file(tempPath, CONFIG_PATH)
+        _knownMtime = _get_mtime()  # Don't reload our own write.
+        _write_snapshot(config, _knownMtime)
     except Exception as e:
         print("Could not save config file: %s" % str(e))
 
 
+def _replace_file(source, destination):
+    """Renames source to destination, replacing destination if it exists."""
+    if sys.platform == "win32":
+        import ctypes
+        MOVEFILE_REPLACE_EXISTING = 0x1
+        MOVEFILE_WRITE_THROUGH = 0x8
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(source),
+                unicode(destination),
+                MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+            raise ctypes.WinError()
+    else:
+        os.rename(source, destination)
+
+
+def _get_mtime():
+    """Returns the modification time of the config file, or None."""
+    try:
+        return os.stat(CONFIG_PATH).st_mtime
+    except OSError:
+        return None
+
+
+def watch_config(interval=None):
+    """Starts watching config.json for changes made outside this module.
+
+    Changes are parsed by a background thread and held until
+    apply_pending_changes() is called.
+
+    """
+    global _watchThread
+    global WATCH_INTERVAL
+    if interval is not None:
+        WATCH_INTERVAL = interval
+    if _watchThread is not None:
+        return
+    _watchStop.clear()
+    _watchThread = threading.Thread(target=_watch_loop, name="Config watcher")
+    _watchThread.daemon = True
+    _watchThread.start()
+
+
+def stop_watching():
+    """Stops the thread started by watch_config()."""
+    global _watchThread
+    if _watchThread is None:
+        return
+    _watchStop.set()
+    _watchThread.join()
+    _watchThread = None
+
+
+def _watch_loop():
+    """Background thread, parses config.json whenever its mtime changes."""
+    global _knownMtime
+    global _pendingConfig
+    failedMtime = None  # Reported once, but retried until it parses.
+    while True:
+        _watchStop.wait(WATCH_INTERVAL)
+        if _watchStop.isSet():
+            return
+        with _writeLock:  # Wait for any ongoing write of our own.
+            mtime = _get_mtime()
+            if mtime is None or mtime == _knownMtime:
+                continue
+            try:
+                newConfig = _read_json_config()[0]
+            except Exception as e:  # E.g. caught mid-write.
+                if mtime != failedMtime:
+                    print("Could not reload config file: %s" % str(e))
+                    failedMtime = mtime
+                continue
+            _knownMtime = mtime
+        with _saveCondition:
+            _pendingConfig = newConfig
+
+
+def apply_pending_changes():
+    """Applies a config reloaded by the watcher, if there is one.
+
+    Only the changed values are updated, and their subscribers notified.
+    Returns a list of the names that changed.
+
+    """
+    global _pendingConfig
+    with _saveCondition:
+        newConfig = _pendingConfig
+        _pendingConfig = None
+    if newConfig is None:
+        return []
+    changedNames = []
+    for name in set(CONFIG.keys()) | set(newConfig.keys()):
+        oldValue = CONFIG.get(name, None)
+        newValue = newConfig.get(name, None)
+        if name in CONFIG and name in newConfig and oldValue == newValue:
+            continue
+        if name in newConfig:
+            CONFIG[name] = newValue
+        else:
+            del CONFIG[name]
+        changedNames.append(name)
+        _notify(name, oldValue, newValue)
+    if changedNames:
+        print("Config reloaded, changed: %s" % ", ".join(sorted(changedNames)))
+    return changedNames
+
+
 def load_config():
+    """Loads the config from the snapshot if it is up to date, otherwise
+    from config.json. CONFIG is updated in place.
+
+    """
     global CONFIG
     global CONFIG_PATH
+    global _knownMtime
+    _knownMtime = _get_mtime()
     try:
-        if os.path.isfile(CONFIG_PATH):  # If the config file exists.
-            with open(CONFIG_PATH, "r") as f:
-                CONFIG = json.loads(f.read())  # Load saved configuration.
-                init_default_values()
+        if _knownMtime is not None:  # If the config file exists.
+            newConfig = _read_snapshot(_knownMtime)
+            if newConfig is None:
+                (newConfig, changed) = _read_json_config()
+                if changed:
+                    save_config()  # Save migrated and default values.
+                else:
+                    _write_snapshot(newConfig, _knownMtime)
+            CONFIG.clear()
+            CONFIG.update(newConfig)
         else:  # If the config file does not exist.
+            init_default_values()
             save_config()  # Save the default config to file.
     except Exception as e:
         print("Could not load config file: %s" % str(e))
 
 
-def init_default_values():
+def _read_json_config():
+    """Parses config.json, then migrates and validates the result.
+
+    Returns a tuple of the config and whether anything had to be changed.
+
+    """
+    with open(CONFIG_PATH, "r") as f:
+        config = json.loads(f.read())  # Load saved configuration.
+    changed = _migrate_config(config)
+    changed = _validate_config(config) or changed
+    changed = init_default_values(config) or changed
+    return (config, changed)
+
+
+def _migrate_0(config):
+    """Version 0 to 1: "dynamics.<name>.enabled" is now "dynamics.<name>"."""
+    for name in list(config.keys()):
+        if name.startswith("dynamics.") and name.endswith(".enabled"):
+            value = config.pop(name)
+            config.setdefault(name[:-len(".enabled")], value)
+
+# Config version to the function migrating a config to the next version.
+MIGRATIONS = {
+    0: _migrate_0,
+}
+
+
+def _migrate_config(config):
+    """Migrates the config to CONFIG_VERSION. Returns True if migrated."""
+    version = config.get("config.version", 0)
+    if not isinstance(version, int) or version > CONFIG_VERSION:
+        print("Unknown config version: %s" % version)
+        return False
+    startVersion = version
+    while version < CONFIG_VERSION:
+        MIGRATIONS[version](config)
+        version += 1
+    config["config.version"] = version
+    return version != startVersion
+
+
+def _get_schema(name):
+    """Returns the (type, default value) for the name, or None if unknown."""
+    if name in SCHEMA:
+        return SCHEMA[name]
+    prefix = name[:name.find(".") + 1]
+    if prefix and prefix in SCHEMA:
+        return SCHEMA[prefix]
+    return None
+
+
+def _validate_config(config):
+    """Replaces values of the wrong type with their default values.
+
+    Returns True if any value was replaced.
+
+    """
+    changed = False
+    for (name, value) in list(config.items()):
+        schema = _get_schema(name)
+        if schema is None or value is None:
+            continue
+        (valueType, default) = schema
+        if not isinstance(value, valueType):
+            print("Invalid config value %s: %r, using %r." % (name, value,
+                default))
+            config[name] = default
+            changed = True
+    return changed
+
+
+def init_default_values(config=None):
+    """Adds the default values for any missing names in the schema.
+
+    Returns True if any value was added.
+
+    """
     global CONFIG
-    valueChangeCount = 0
-    defaultValues = [
-        ("aenea.enabled", False),
-        ("aenea.path", None),
-    ]
-    for (name, value) in defaultValues:
-        if not name in CONFIG.keys():
-            CONFIG[name] = value
-            valueChangeCount += 1
-    if valueChangeCount > 0:
-        save_config()
+    if config is None:
+        config = CONFIG
+    changed = False
+    for (name, (valueType, default)) in SCHEMA.items():  # @UnusedVariable
+        if not name.endswith(".") and not name in config:
+            config[name] = default
+            changed = True
+    return changed
+
+
+def _read_snapshot(mtime):
+    """Returns the config from the snapshot, or None if the snapshot is
+    missing, was not taken of the config file with the given mtime, or was
+    taken with another config version or schema.
+
+    """
+    try:
+        with open(SNAPSHOT_PATH, "rb") as f:
+            (snapshotMtime, version, schemaDigest, config) = marshal.load(f)
+    except Exception:
+        return None
+    if snapshotMtime != mtime or version != CONFIG_VERSION or \
+            schemaDigest != SCHEMA_DIGEST:
+        return None
+    return config
+
+
+def _write_snapshot(config, mtime):
+    """Saves a validated config, tagged with the mtime of config.json, the
+    config version and the schema digest.
+
+    """
+    if mtime is None:
+        return
+    try:
+        with open(SNAPSHOT_PATH, "wb") as f:
+            marshal.dump((mtime, CONFIG_VERSION, SCHEMA_DIGEST,
+                dict(config)), f)
+    except Exception as e:
+        print("Could not save config snapshot: %s" % str(e))
 
 
 def get_config():
@@ -81,11 +465,156 @@ def get_config():
     return CONFIG
 
 
+def get_settings():
+    """Returns the cached, typed view of the config."""
+    global SETTINGS
+    return SETTINGS
+
+
+def set_value(name, value):
+    """Sets a config value and schedules a save.
+
+    If the value changed, subscribers for the name are notified. Returns
+    True if the value changed, otherwise False.
+
+    """
+    global CONFIG
+    oldValue = CONFIG.get(name, None)
+    if name in CONFIG and oldValue == value:
+        return False
+    CONFIG[name] = value
+    save_config()
+    _notify(name, oldValue, value)
+    return True
+
+
+def subscribe(name, callback):
+    """Registers callback(name, oldValue, newValue), to be called when the
+    named config value changes. Use name None to be notified of all changes.
+
+    """
+    callbacks = _subscribers.setdefault(name, [])
+    if not callback in callbacks:
+        callbacks.append(callback)
+
+
+def unsubscribe(name, callback):
+    """Removes a callback previously registered with subscribe()."""
+    callbacks = _subscribers.get(name, [])
+    if callback in callbacks:
+        callbacks.remove(callback)
+
+
+def _notify(name, oldValue, newValue):
+    """Refreshes the cached settings and calls the subscribers of name."""
+    SETTINGS.refresh(name)
+    callbacks = _subscribers.get(name, []) + _subscribers.get(None, [])
+    for callback in callbacks:
+        try:
+            callback(name, oldValue, newValue)
+        except Exception as e:
+            print("Config subscriber failed for '%s': %s" % (name, str(e)))
+
+
+SETTINGS = Settings()
 load_config()
+SETTINGS.refresh()
+atexit.register(flush_config)
+
+# Aenea is in the MacroSystem directory, unless aenea.path says otherwise.
+lib.importpath.add_path(SETTINGS.aenea_path or WORKING_PATH)
+
+
+def _use_temporary_files():
+    """Points the config and snapshot paths to a temporary directory, for
+    the benchmarks. Returns the previous paths, for _restore_files().
+
+    """
+    global CONFIG_PATH
+    global SNAPSHOT_PATH
+    import tempfile
+    savedPaths = (CONFIG_PATH, SNAPSHOT_PATH, _knownMtime)
+    directory = tempfile.mkdtemp()
+    CONFIG_PATH = os.path.join(directory, "config.json")
+    SNAPSHOT_PATH = os.path.join(directory, "config.snapshot")
+    return savedPaths
+
+
+def _restore_files(savedPaths):
+    global CONFIG_PATH
+    global SNAPSHOT_PATH
+    global _knownMtime
+    (CONFIG_PATH, SNAPSHOT_PATH, _knownMtime) = savedPaths
+
+
+def _write_config_directly():
+    """The previous save_config(), a plain write on the caller's thread.
+    Only kept for _benchmark_toggles().
+
+    """
+    try:
+        configData = json.dumps(CONFIG, sort_keys=True, indent=4,
+            ensure_ascii=False)
+        with open(CONFIG_PATH, "w+") as f:
+            f.write(configData)  # Save config to file.
+    except Exception as e:
+        print("Could not save config file: %s" % str(e))
+
+
+def _benchmark_toggles(count=50):
+    """Measures the time the caller spends per toggle and save, for count
+    toggles, with the previous plain write and the write-behind save.
+
+    """
+    savedPaths = _use_temporary_files()
+    hadValue = "dynamics.python" in CONFIG
+    savedValue = CONFIG.get("dynamics.python", None)
+    try:
+        for (name, save) in (("synchronous", _write_config_directly),
+                             ("write-behind", save_config)):
+            timings = []
+            for i in range(count):
+                start = default_timer()
+                CONFIG["dynamics.python"] = (i % 2 == 0)
+                save()
+                timings.append(default_timer() - start)
+            flush_config()
+            print("%-12s total %8.3f ms, mean %7.1f us, max %7.1f us" % (
+                name, sum(timings) * 1000, sum(timings) / count * 1e6,
+                max(timings) * 1e6))
+    finally:
+        _restore_files(savedPaths)
+        if hadValue:
+            CONFIG["dynamics.python"] = savedValue
+        else:
+            CONFIG.pop("dynamics.python", None)
+
+
+def _benchmark_startup(count=200):
+    """Measures load_config() when parsing and validating config.json, and
+    when loading the snapshot.
+
+    """
+    savedPaths = _use_temporary_files()
+    savedConfig = dict(CONFIG)
+    try:
+        _write_config()
+        for name in ("json", "snapshot"):
+            timings = []
+            for i in range(count):  # @UnusedVariable
+                if name == "json" and os.path.isfile(SNAPSHOT_PATH):
+                    os.remove(SNAPSHOT_PATH)
+                start = default_timer()
+                load_config()
+                timings.append(default_timer() - start)
+            print("%-12s mean %7.1f us, min %7.1f us" % (name,
+                sum(timings) / count * 1e6, min(timings) * 1e6))
+    finally:
+        _restore_files(savedPaths)
+        CONFIG.clear()
+        CONFIG.update(savedConfig)
+
 
-aeneaPath = CONFIG.get("aenea.path", None)
-if not aeneaPath:
-    path = os.path.dirname(os.path.abspath(__file__))
-    aeneaPath = os.path.split(path)[:-1]
-if not aeneaPath in sys.path:
-    sys.path.insert(0, aeneaPath)
+if __name__ == "__main__":  # Run as "python -m lib.config" from MacroSystem.
+    _benchmark_toggles()
+    _benchmark_startup()
@@ -1,6 +1,138 @@
+import os
 import re
+import string
+from timeit import default_timer
 
-from dragonfly import Key, Text, Clipboard, Pause
+import lib.backend
+import lib.config
+import lib.text
+
+CUT_TIMEOUT = 0.5  # Seconds to wait for cut text, until a timeout is learned.
+MIN_CUT_TIMEOUT = 0.3  # The fixed timeout before timeouts were learned.
+MAX_CUT_TIMEOUT = 2.0
+POLL_INTERVAL = 0.005  # Seconds, first clipboard poll, doubled per poll.
+MAX_POLL_INTERVAL = 0.05
+
+# Terminated string literals, which are kept as they are, runs of operator
+# characters, and commas and colons directly followed by an operand. A quote
+# without a closing one, like in "it's", is an ordinary character.
+_expandPattern = re.compile(
+    r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''
+    r'''|([=+\-*/%]+)|([:,])(?=[a-zA-Z0-9_"'])''')
+_operandEnds = frozenset(string.ascii_letters + string.digits + '_"\')')
+_operandStarts = frozenset(string.ascii_letters + string.digits + '_"\'(')
+# Words that ctrl+left steps over one at a time in any edit control, without
+# stopping at punctuation or line starts.
+_plainWordsPattern = re.compile(r"[\w \t]*\Z", re.UNICODE)
+settings = lib.config.get_settings()
+_accessStats = {}  # Text access path to [count, total seconds, last seconds].
+_cutLatencies = {}  # Executable name to average seconds until cut text came.
+
+
+def _lower_first(word):
+    return word[:1].lower() + word[1:]
+
+
+def _capitalize(word):
+    return word.capitalize()
+
+
+def _title(word):
+    return word.title()
+
+
+def _lower(text):
+    return text.lower()
+
+
+def _upper(text):
+    return text.upper()
+
+
+# Style name to (separator, first word function, word function). The first
+# function formats the first non-empty word, the other function the rest,
+# None keeps words as they are. The words are then joined by the separator.
+# A style without separator formats the text as a whole with the first
+# function, keeping its whitespace.
+STYLES = {
+    "camel": ("", _lower_first, _capitalize),
+    "pascal": ("", _title, _title),
+    "snake": ("_", _lower, _lower),
+    "squash": ("", None, None),
+    "kebab": ("-", _lower, _lower),
+    "dotted": (".", _lower, _lower),
+    "constant": ("_", _upper, _upper),
+    "upper": (None, _upper, None),
+    "lower": (None, _lower, None),
+}
+
+
+def format_words(style, words):
+    """Returns the list of words formatted and joined in the style.
+
+    Example:
+    format_words("camel", ["my", "new", "variable"]) => "myNewVariable".
+
+    """
+    (separator, first_function, word_function) = STYLES[style]
+    if separator is None:
+        return first_function(" ".join(words))
+    formatted = []
+    wordIndex = 0
+    for word in words:  # Leading empty words don't count as first word.
+        if word:
+            break
+        formatted.append(word)
+        wordIndex += 1
+    if wordIndex < len(words) and first_function is not None:
+        formatted.append(first_function(words[wordIndex]))
+        wordIndex += 1
+    if word_function is None:
+        formatted.extend(words[wordIndex:])
+    else:
+        formatted.extend([word_function(word) for word in words[wordIndex:]])
+    return separator.join(formatted)
+
+
+def format_string(style, text):
+    """Returns text in the style. Text from an editor is cleaned up first,
+    see _cleanup_text(), and a trailing space is kept.
+
+    """
+    (separator, first_function, word_function) = STYLES[style]  # @UnusedVariable @IgnorePep8
+    if separator is None:
+        return first_function(text)
+    endSpace = text.endswith(' ')
+    newText = format_words(style, _cleanup_text(text).split(' '))
+    if endSpace:
+        newText = newText + ' '
+    return newText
+
+
+def format_text(style, text):
+    """Types dictated text in the style.
+
+    Example:
+    "'kebab case my new variable'" => "my-new-variable".
+
+    """
+    (separator, first_function, word_function) = STYLES[style]  # @UnusedVariable @IgnorePep8
+    if separator is None:
+        newText = first_function(str(text))
+    else:
+        newText = format_words(style, text.words)
+    _type_text(newText)
+
+
+def format_count(style, n):
+    """Formats n words to the left of the cursor in the style.
+    Note that word count differs between editors and programming languages.
+
+    Example:
+    "'my new variable' *pause* 'constant case 3'" => "MY_NEW_VARIABLE".
+
+    """
+    _reformat_words(n, lambda cutText: format_string(style, cutText))
 
 
 def camel_case_text(text):
@@ -10,8 +142,7 @@ def camel_case_text(text):
     "'camel case my new variable'" => "myNewVariable".
 
     """
-    newText = _camelify(text.words)
-    Text(newText).execute()
+    format_text("camel", text)
 
 
 def camel_case_count(n):
@@ -23,35 +154,7 @@ def camel_case_count(n):
     "'my new variable' *pause* 'camel case 3'" => "myNewVariable".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        endSpace = cutText.endswith(' ')
-        text = _cleanup_text(cutText)
-        newText = _camelify(text.split(' '))
-        if endSpace:
-            newText = newText + ' '
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
-
-
-def _camelify(words):
-    """Takes a list of words and returns a string formatted to camel case.
-
-    Example:
-    ["my", "new", "variable"] => "myNewVariable".
-
-    """
-    newText = ''
-    for word in words:
-        if newText == '':
-            newText = word[:1].lower() + word[1:]
-        else:
-            newText = '%s%s' % (newText, word.capitalize())
-    return newText
+    format_count("camel", n)
 
 
 def pascal_case_text(text):
@@ -61,9 +164,7 @@ def pascal_case_text(text):
     "'pascal case my new variable'" => "MyNewVariable".
 
     """
-    newText = str(text).title()
-    newText = "".join(newText.split(" "))
-    Text(newText).execute()
+    format_text("pascal", text)
 
 
 def pascal_case_count(n):
@@ -75,19 +176,7 @@ def pascal_case_count(n):
     "'my new variable' *pause* 'pascal case 3'" => "MyNewVariable".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        endSpace = cutText.endswith(' ')
-        text = _cleanup_text(cutText)
-        newText = text.title().replace(' ', '')
-        if endSpace:
-            newText = newText + ' '
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    format_count("pascal", n)
 
 
 def snake_case_text(text):
@@ -97,8 +186,7 @@ def snake_case_text(text):
     "'snake case my new variable'" => "my_new_variable".
 
     """
-    newText = '_'.join([word.lower() for word in text.words])
-    Text(newText).execute()
+    format_text("snake", text)
 
 
 def snake_case_count(n):
@@ -110,19 +198,7 @@ def snake_case_count(n):
     "'my new variable' *pause* 'snake case 3'" => "my_new_variable".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        endSpace = cutText.endswith(' ')
-        text = _cleanup_text(cutText.lower())
-        newText = '_'.join(text.split(' '))
-        if endSpace:
-            newText = newText + ' '
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    format_count("snake", n)
 
 
 def squash_text(text):
@@ -132,8 +208,7 @@ def squash_text(text):
     "'squash my new variable'" => "mynewvariable".
 
     """
-    newText = ''.join(text.words)
-    Text(newText).execute()
+    format_text("squash", text)
 
 
 def squash_count(n):
@@ -146,19 +221,7 @@ def squash_count(n):
     "'my<tab>new variable' *pause* 'squash 3'" => "mynewvariable".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        endSpace = cutText.endswith(' ')
-        text = _cleanup_text(cutText)
-        newText = ''.join(text.split(' '))
-        if endSpace:
-            newText = newText + ' '
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    format_count("squash", n)
 
 
 def expand_count(n):
@@ -171,35 +234,32 @@ def expand_count(n):
     "result=(width1+width2)/2 'expand 9' " => "result = (width1 + width2) / 2"
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        endSpace = cutText.endswith(' ')
-        reg = re.compile(r'[:,%][a-zA-Z0-9_\"\']')
-        hit = reg.search(cutText)
-        count = 0
-        while hit and count < 10:
-            cutText = cutText[:hit.start() + 1] + ' ' + \
-                cutText[hit.end() - 1:]
-            hit = reg.search(cutText)
-            count += 1
-        reg = re.compile(
-            r'([a-zA-Z0-9_\"\'\)][=\+\-\*/\%]|[=\+\-\*/\%][a-zA-Z0-9_\"\'\(])')
-        hit = reg.search(cutText)
-        count = 0
-        while hit and count < 10:
-            cutText = cutText[:hit.start() + 1] + ' ' + \
-                cutText[hit.end() - 1:]
-            hit = reg.search(cutText)
-            count += 1
-        newText = cutText
-        if endSpace:
-            newText = newText + ' '
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    _reformat_words(n, _expand_format)
+
+
+def _expand_format(cutText):
+    """Returns cutText with whitespace added around operators, and after
+    commas and colons, leaving string literals as they are.
+
+    The text is scanned once, so this is linear in its length.
+
+    """
+    return _expandPattern.sub(_expand_token, cutText)
+
+
+def _expand_token(match):
+    """Replacement function of _expandPattern."""
+    token = match.group(0)
+    if match.lastindex == 1:  # A string literal.
+        return token
+    if match.lastindex == 3:  # A comma or colon followed by an operand.
+        return token + ' '
+    text = match.string  # An operator, the spaced characters are checked.
+    if match.start() > 0 and text[match.start() - 1] in _operandEnds:
+        token = ' ' + token
+    if match.end() < len(text) and text[match.end()] in _operandStarts:
+        token = token + ' '
+    return token
 
 
 def uppercase_text(text):
@@ -209,9 +269,7 @@ def uppercase_text(text):
     "'upper case my new variable'" => "MY NEW VARIABLE".
 
     """
-    newText = str(text)
-    newText = newText.replace("%", "%%")  # Escape any format chars.
-    Text(newText.upper()).execute()
+    format_text("upper", text)
 
 
 def uppercase_count(n):
@@ -223,15 +281,7 @@ def uppercase_count(n):
     "'my new variable' *pause* 'upper case 3'" => "MY NEW VARIABLE".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        newText = cutText.upper()
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    format_count("upper", n)
 
 
 def lowercase_text(text):
@@ -241,8 +291,7 @@ def lowercase_text(text):
     "'lower case John Johnson'" => "john johnson".
 
     """
-    newText = str(text)
-    Text(newText.lower()).execute()
+    format_text("lower", text)
 
 
 def lowercase_count(n):
@@ -254,15 +303,71 @@ def lowercase_count(n):
     "'John Johnson' *pause* 'lower case 2'" => "john johnson".
 
     """
-    saveText = _get_clipboard_text()
-    cutText = _select_and_cut_text(n)
-    if cutText:
-        newText = cutText.lower()
-        newText = newText.replace("%", "%%")  # Escape any format chars.
-        Text(newText).execute()
-    else:  # Failed to get text from clipboard.
-        Key('c-v').execute()  # Restore cut out text.
-    _set_clipboard_text(saveText)
+    format_count("lower", n)
+
+
+def format_selection(style, line=False):
+    """Formats the selected text in the style, or the line of the cursor if
+    line is True. Each line of the text is formatted separately, keeping its
+    indentation, so a block of identifiers is renamed in one go.
+
+    Example, with "my new variable" on a line:
+    "'snake case whole line'" => "my_new_variable".
+
+    """
+    _reformat_selection(lambda text: format_string(style, text), line)
+
+
+def expand_selection(line=False):
+    """Adds whitespace around operators in the selected text, or in the line
+    of the cursor if line is True. See expand_count().
+
+    """
+    _reformat_selection(_expand_format, line)
+
+
+def _reformat_selection(format_function, line):
+    """Replaces the selection, or the line of the cursor, with the result of
+    format_function applied to each of its lines.
+
+    The text takes a single clipboard round trip: it is copied, formatted,
+    and pasted back at once, instead of being typed, so the size of the
+    selection hardly matters. The clipboard is restored afterwards.
+
+    """
+    backend = _backend()
+    start = default_timer()
+    saved = backend.save_clipboard()
+    try:
+        if line:
+            backend.press('home, s-end')
+        backend.set_clipboard_text('')
+        sequence = backend.get_clipboard_sequence()
+        backend.press('c-c')
+        text = _wait_for_clipboard(sequence,
+            get_cut_timeout(_get_executable_name()))
+        if text:
+            newText = ''.join(_format_lines(text, format_function))
+            if newText != text:
+                lib.text.paste_text(newText, restore=False)
+    finally:
+        backend.restore_clipboard(saved)
+    _record_access("selection", default_timer() - start)
+
+
+def _format_lines(text, format_function):
+    """Yields the lines of text one by one, formatted by format_function, but
+    with their indentation and line breaks kept.
+
+    """
+    for line in text.splitlines(True):
+        content = line.rstrip('\r\n')
+        words = content.lstrip()
+        if words:
+            yield content[:len(content) - len(words)] + \
+                format_function(words) + line[len(content):]
+        else:
+            yield line
 
 
 def _cleanup_text(text):
@@ -293,35 +398,262 @@ def _cleanup_text(text):
     return text
 
 
-def _get_clipboard_text():
-    """Returns the text contents of the system clip board."""
-    clipboard = Clipboard()
-    return clipboard.get_system_text()
+def _reformat_words(wordCount, format_function):
+    """Replaces wordCount words to the left of the cursor with the result of
+    format_function, called with the words as a string.
+
+    The text is read and replaced directly when the backend offers text
+    access for the focused control, and the words are plain enough to be
+    found the way ctrl+left would find them. Otherwise the words are selected and cut
+    through the clipboard, and the result is typed, or pasted if it has at
+    least format.paste_threshold characters (see lib.config). All the
+    clipboard contents are restored afterwards.
+
+    """
+    start = default_timer()
+    access = _backend().get_text_access()
+    if access is not None:
+        textAndCaret = access.get_text_before_caret()
+        if textAndCaret is not None:
+            (text, caret) = textAndCaret
+            wordStart = _find_word_start(text, caret, wordCount)
+            if wordStart == caret or wordStart is not None and \
+                    access.replace(wordStart, caret,
+                    format_function(text[wordStart:caret])):
+                _record_access("text access", default_timer() - start)
+                return
+    backend = _backend()
+    saved = backend.save_clipboard()
+    try:
+        cutText = _select_and_cut_text(wordCount)
+        if cutText:
+            newText = format_function(cutText)
+            if len(newText) >= settings.format_paste_threshold:
+                # Constant time, instead of per character.
+                lib.text.paste_text(newText, restore=False)
+            else:
+                _type_text(newText)
+        else:  # Failed to get text from clipboard.
+            backend.press('c-v')  # Restore cut out text.
+            # Let the application read the clipboard before it is restored.
+            backend.pause(lib.text.PASTE_DELAY)
+    finally:
+        backend.restore_clipboard(saved)
+    _record_access("clipboard", default_timer() - start)
+
+
+def _find_word_start(text, caret, wordCount):
+    """Returns the position wordCount words to the left of caret, where
+    pressing ctrl+left in an edit control would take the cursor, or None if
+    that depends on the control.
+
+    Words are split at whitespace here, but ctrl+left also stops at
+    punctuation in most controls, so only words of letters, digits and
+    underscores on one line give a position.
+
+    """
+    position = caret
+    for i in range(wordCount):  # @UnusedVariable
+        while position > 0 and text[position - 1].isspace():
+            position -= 1
+        while position > 0 and not text[position - 1].isspace():
+            position -= 1
+    if not _plainWordsPattern.match(text, position, caret):
+        return None
+    return position
+
+
+def _record_access(path, seconds):
+    stats = _accessStats.setdefault(path, [0, 0.0, 0.0])
+    stats[0] += 1
+    stats[1] += seconds
+    stats[2] = seconds
+
+
+def get_access_stats():
+    """Returns a dict of the text access path used by the *_count functions,
+    "text access" or "clipboard", or "selection" for the *_selection
+    functions, to (count, mean seconds, last seconds).
+
+    """
+    result = {}
+    for (path, (count, total, last)) in _accessStats.items():
+        result[path] = (count, total / count, last)
+    return result
+
+
+def print_access_stats():
+    """Prints which text access paths were used, and their latency."""
+    for (path, (count, mean, last)) in sorted(get_access_stats().items()):
+        print("%-12s %5d calls, mean %7.1f ms, last %7.1f ms" % (path, count,
+            mean * 1000, last * 1000))
+
+
+def _backend():
+    return lib.backend.get_backend()
+
+
+def _type_text(text):
+    """Types the text as it is."""
+    _backend().type_text(text)
 
 
 def _select_and_cut_text(wordCount):
     """Selects wordCount number of words to the left of the cursor and cuts
     them out of the text. Returns the text from the system clip board.
 
+    Instead of sleeping for a fixed time, the clipboard is polled until the
+    cut text arrives, or until the timeout learned for the application runs
+    out, see get_cut_timeout().
+
     """
-    clipboard = Clipboard()
-    clipboard.set_system_text('')
+    backend = _backend()
+    backend.set_clipboard_text('')
+    sequence = backend.get_clipboard_sequence()
     try:  # Try selecting n number of words.
-        Key('ctrl:down, shift:down').execute()
-        Key('left:%s' % wordCount).execute()
-        Key('shift:up').execute()
+        backend.press('ctrl:down, shift:down')
+        backend.press('left:%s' % wordCount)
+        backend.press('shift:up')
     finally:
         # It is important to make sure that the buttons are released.
         # Otherwise you get stuck in an unpleasant situation.
-        Key('shift:up, ctrl:up').execute()
-    Pause("10").execute()
-    Key('c-x').execute()  # Cut out the selected words.
-    Pause("20").execute()
-    return clipboard.get_system_text()
-
-
-def _set_clipboard_text(text):
-    """Sets the system clip board content."""
-    clipboard = Clipboard()
-    clipboard.set_text(text)  # Restore previous clipboard text.
-    clipboard.copy_to_system()
+        backend.press('shift:up, ctrl:up')
+    executable = _get_executable_name()
+    start = default_timer()
+    backend.press('c-x')  # Cut out the selected words.
+    text = _wait_for_clipboard(sequence, get_cut_timeout(executable))
+    if text:
+        _learn_cut_timeout(executable, default_timer() - start)
+    else:
+        _learn_cut_timeout(executable, None)
+    return text
+
+
+def _wait_for_clipboard(sequence, timeout):
+    """Polls the clipboard until it holds text again, with exponential
+    backoff. Returns the text, or '' if no text arrived within timeout
+    seconds.
+
+    The text is only read when the clipboard sequence number has changed
+    from sequence, unless the backend has no sequence numbers.
+
+    """
+    backend = _backend()
+    # Measured like the latencies in _learn_cut_timeout(), since sleeps run
+    # longer than asked, e.g. about 15 ms at least on Windows.
+    deadline = default_timer() + timeout
+    interval = POLL_INTERVAL
+    while True:
+        if sequence is None or backend.get_clipboard_sequence() != sequence:
+            text = backend.get_clipboard_text()
+            if text:
+                return text
+        remaining = deadline - default_timer()
+        if remaining <= 0:
+            return ''
+        backend.pause(min(interval, remaining))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+
+
+def _get_executable_name():
+    """Returns the lower case file name of the foreground application."""
+    try:
+        executable = _backend().get_foreground_executable()
+    except Exception:
+        return ''
+    return os.path.basename(executable or '').lower()
+
+
+def get_cut_timeout(executable):
+    """Returns the seconds to wait for cut text to reach the clipboard in the
+    application, as learned in earlier sessions.
+
+    """
+    if not executable:
+        return CUT_TIMEOUT
+    timeout = lib.config.get_config().get('cut_timeout.' + executable)
+    if timeout is None:
+        return CUT_TIMEOUT
+    return timeout
+
+
+def _learn_cut_timeout(executable, latency):
+    """Adjusts the timeout of the application after a cut, latency being
+    the seconds until the text arrived, or None if it never did.
+
+    The timeout follows three times the average latency, and is doubled
+    after a failure. Changes are saved to the config, so they are kept
+    between sessions.
+
+    """
+    if not executable:
+        return
+    timeout = get_cut_timeout(executable)
+    if latency is None:
+        newTimeout = timeout * 2
+    else:
+        average = _cutLatencies.get(executable)
+        if average is None:
+            average = latency
+        else:
+            average = average * 0.75 + latency * 0.25
+        _cutLatencies[executable] = average
+        newTimeout = max(average * 3, latency * 1.5)
+    newTimeout = round(min(max(newTimeout, MIN_CUT_TIMEOUT),
+        MAX_CUT_TIMEOUT), 2)
+    if abs(newTimeout - timeout) >= 0.05:
+        lib.config.set_value('cut_timeout.' + executable, newTimeout)
+
+
+def _expand_by_search(cutText, maxHits=10):
+    """The previous implementation of _expand_format(), which searches from
+    the start after every hit, and stops after maxHits hits per pattern, or
+    never if maxHits is None. Only kept for _benchmark_expand().
+
+    """
+    reg = re.compile(r'[:,%][a-zA-Z0-9_\"\']')
+    hit = reg.search(cutText)
+    count = 0
+    while hit and (maxHits is None or count < maxHits):
+        cutText = cutText[:hit.start() + 1] + ' ' + \
+            cutText[hit.end() - 1:]
+        hit = reg.search(cutText)
+        count += 1
+    reg = re.compile(
+        r'([a-zA-Z0-9_\"\'\)][=\+\-\*/\%]|[=\+\-\*/\%][a-zA-Z0-9_\"\'\(])')
+    hit = reg.search(cutText)
+    count = 0
+    while hit and (maxHits is None or count < maxHits):
+        cutText = cutText[:hit.start() + 1] + ' ' + \
+            cutText[hit.end() - 1:]
+        hit = reg.search(cutText)
+        count += 1
+    return cutText
+
+
+def _benchmark_expand(repeat=5):
+    """Compares _expand_format() with _expand_by_search() on long lines.
+
+    The previous implementation is measured both as it was, stopping after
+    10 hits, and expanding the whole line.
+
+    """
+    line = 'result=(width1+width2)/2,values["a,b"]=x%3:'
+    functions = [
+        ("search, 10 hits", _expand_by_search),
+        ("search, all hits", lambda text: _expand_by_search(text, None)),
+        ("tokenizer", _expand_format),
+    ]
+    for length in (1, 10, 100, 400):
+        text = line * length
+        for (name, function) in functions:
+            start = default_timer()
+            for i in range(repeat):  # @UnusedVariable
+                function(text)
+            elapsed = (default_timer() - start) / repeat
+            print("%-18s %6d chars %12.1f us" % (name, len(text),
+                elapsed * 1e6))
+
+
+if __name__ == "__main__":
+    _benchmark_expand()
@@ -2,6 +2,11 @@
 import Tkinter as tk
 from Tkconstants import *  # @UnusedWildImport
 import time
+import random
+import threading
+from array import array
+from collections import deque
+from timeit import default_timer
 
 from dragonfly import (
     Rectangle,
@@ -10,7 +15,24 @@ from dragonfly import (
 )
 
 
-class GridConfig:
+class GridConfig(object):
+    """The geometry of a grid: its position and size, and the positions of
+    its 9 x 9 lines, relative to its position.
+
+    The axes and the rectangles of the 3 x 3 sections are kept in arrays,
+    and only change with the size of the grid. They are computed once per
+    size, and shared by all grids through _geometryCache, so repeated drill
+    downs only do lookups.
+
+    """
+    __slots__ = ["monitorPositionX", "monitorPositionY", "monitorWidth",
+        "monitorHeight", "monitorNum", "positionX", "positionY", "width",
+        "height", "axisX", "axisY", "_sections"]
+
+    COLUMNS = 9
+    MAX_CACHED_GEOMETRIES = 1000
+    _geometryCache = {}  # (width, height) to (axisX, axisY, sections).
+
     def __init__(self, positionX=0, positionY=0, width=1024, height=768,
                  monitorNum=None):
         self.monitorPositionX = positionX
@@ -27,30 +49,66 @@ class GridConfig:
         self.height = self.monitorHeight
         self.calculate_axis()
 
+    def get_geometry(self):
+        """Returns (positionX, positionY, width, height)."""
+        return (self.positionX, self.positionY, self.width, self.height)
+
+    def set_geometry(self, positionX, positionY, width, height):
+        """Moves and resizes the grid, see get_geometry()."""
+        self.positionX = positionX
+        self.positionY = positionY
+        self.width = width
+        self.height = height
+        self.calculate_axis()
+
     def get_geometry_string(self):
         geometry = "%dx%d+%d+%d" % (self.width, self.height, self.positionX,
                                     self.positionY)
         return geometry
 
     def calculate_axis(self):
-        columns = 9
-        stepX = self.width / columns
-        stepY = self.height / columns
-        xDiff = (self.width - 1) - (columns * stepX)
-        yDiff = (self.height - 1) - (columns * stepY)
-        self.axisX = self._calculate_one_axis(stepX, columns, xDiff)
-        self.axisY = self._calculate_one_axis(stepY, columns, yDiff)
-
-    def _calculate_one_axis(self, step, columns, diff):
-        axis = []
-        addTo = 0
-        for value in range(0, step * (columns + 1), step):
-            value += addTo
-            axis.append(value)
-            if diff > 0:
-                addTo += 1
-                diff -= 1
-        return axis
+        """Sets the axes and sections for the current size."""
+        key = (self.width, self.height)
+        geometry = self._geometryCache.get(key)
+        if geometry is None:
+            if len(self._geometryCache) >= self.MAX_CACHED_GEOMETRIES:
+                self._geometryCache.clear()
+            geometry = self._calculate_geometry(self.width, self.height)
+            self._geometryCache[key] = geometry
+        (self.axisX, self.axisY, self._sections) = geometry
+
+    @classmethod
+    def _calculate_geometry(cls, width, height):
+        """Returns the axes and sections for a grid of the given size.
+
+        The sections are an array of x1, y1, x2, y2 for section 1 to 9.
+
+        """
+        columns = cls.COLUMNS
+        stepX = width / columns
+        stepY = height / columns
+        xDiff = (width - 1) - (columns * stepX)
+        yDiff = (height - 1) - (columns * stepY)
+        axisX = cls._calculate_one_axis(stepX, columns, xDiff)
+        axisY = cls._calculate_one_axis(stepY, columns, yDiff)
+        sections = array("i")
+        for row in range(3):
+            for column in range(3):
+                sections.extend((axisX[3 * column], axisY[3 * row],
+                    axisX[3 * column + 3], axisY[3 * row + 3]))
+        return (axisX, axisY, sections)
+
+    @staticmethod
+    def _calculate_one_axis(step, columns, diff):
+        """Returns the line positions along one axis. The first diff lines
+        after the first are moved one pixel each, to spread the remainder.
+
+        """
+        if step <= 0:
+            raise ValueError("Grid is too small for %d columns." % columns)
+        diff = max(diff, 0)
+        return array("i", [index * step + min(index, diff) for index in
+            range(columns + 1)])
 
     def get_relative_center_point(self):
         positionX = self.width / 2
@@ -63,22 +121,50 @@ class GridConfig:
         positionY = self.positionY + y
         return (positionX, positionY)
 
-    def _get_coordinates(self):
-        return {
-            1: (self.axisX[0], self.axisY[0], self.axisX[3], self.axisY[3]),
-            2: (self.axisX[3], self.axisY[0], self.axisX[6], self.axisY[3]),
-            3: (self.axisX[6], self.axisY[0], self.axisX[9], self.axisY[3]),
-            4: (self.axisX[0], self.axisY[3], self.axisX[3], self.axisY[6]),
-            5: (self.axisX[3], self.axisY[3], self.axisX[6], self.axisY[6]),
-            6: (self.axisX[6], self.axisY[3], self.axisX[9], self.axisY[6]),
-            7: (self.axisX[0], self.axisY[6], self.axisX[3], self.axisY[9]),
-            8: (self.axisX[3], self.axisY[6], self.axisX[6], self.axisY[9]),
-            9: (self.axisX[6], self.axisY[6], self.axisX[9], self.axisY[9]),
-        }
+    def _get_section(self, section):
+        """Returns (x1, y1, x2, y2) of the section, relative to the grid."""
+        index = (section - 1) * 4
+        return tuple(self._sections[index:index + 4])
+
+    @classmethod
+    def _get_span(cls, size, index):
+        """Returns the positions of line index and line index + 3 along an
+        axis of the given size, computed directly, without the axis.
+
+        """
+        step = size / cls.COLUMNS
+        if step <= 0:
+            raise ValueError("Grid is too small for %d columns." % cls.COLUMNS)
+        diff = max((size - 1) - (cls.COLUMNS * step), 0)
+        return (index * step + min(index, diff),
+            (index + 3) * step + min(index + 3, diff))
+
+    def resolve(self, sections):
+        """Returns (positionX, positionY, width, height) of the grid after
+        selecting the sections in order, see select_section(), without
+        changing the grid.
+
+        Each level takes a few integer operations, so a whole drill down is
+        resolved without computing any intermediate axes or windows.
+
+        """
+        (x, y, width, height) = (self.positionX, self.positionY, self.width,
+            self.height)
+        for section in sections:
+            (x1, x2) = self._get_span(width, 3 * ((section - 1) % 3))
+            (y1, y2) = self._get_span(height, 3 * ((section - 1) / 3))
+            if width > 25:
+                zoomed = self._get_adjusted_edges(x + x1, y + y1, x2 - x1,
+                    y2 - y1)
+                if zoomed[2] >= self.COLUMNS and zoomed[3] >= self.COLUMNS:
+                    (x, y, width, height) = zoomed
+                    continue
+            x += (x2 + x1) / 2 - width / 2
+            y += (y2 + y1) / 2 - height / 2
+        return (x, y, width, height)
 
     def recalculate_to_section(self, section):
-        coordinates = self._get_coordinates()
-        (x1, y1, x2, y2) = coordinates[section]
+        (x1, y1, x2, y2) = self._get_section(section)
         self.positionX = self.positionX + x1
         self.positionY = self.positionY + y1
         self.width = x2 - x1
@@ -86,22 +172,31 @@ class GridConfig:
         self._adjust_edges()
 
     def _adjust_edges(self):
-        if self.positionX > (self.monitorPositionX + 2):
-            self.positionX -= 2
-            self.width += 2
-        if self.positionY > (self.monitorPositionY + 2):
-            self.positionY -= 2
-            self.height += 2
-        if (self.positionX + self.width) < (self.monitorPositionX + \
-                                            self.monitorWidth - 2):
-            self.width += 2
-        if (self.positionY + self.height) < (self.monitorPositionY + \
-                                             self.monitorWidth - 2):
-            self.height += 2
+        (self.positionX, self.positionY, self.width, self.height) = \
+            self._get_adjusted_edges(self.positionX, self.positionY,
+                self.width, self.height)
+
+    def _get_adjusted_edges(self, positionX, positionY, width, height):
+        """Returns the rectangle grown by 2 pixels on each side that is not
+        at the edge of the monitor.
+
+        """
+        if positionX > (self.monitorPositionX + 2):
+            positionX -= 2
+            width += 2
+        if positionY > (self.monitorPositionY + 2):
+            positionY -= 2
+            height += 2
+        if (positionX + width) < (self.monitorPositionX + \
+                                  self.monitorWidth - 2):
+            width += 2
+        if (positionY + height) < (self.monitorPositionY + \
+                                   self.monitorWidth - 2):
+            height += 2
+        return (positionX, positionY, width, height)
 
     def move_to_section(self, section):
-        coordinates = self._get_coordinates()
-        (x1, y1, x2, y2) = coordinates[section]
+        (x1, y1, x2, y2) = self._get_section(section)
         sectionPositionX = (x2 + x1) / 2
         sectionPositionY = (y2 + y1) / 2
         centerX, centerY = self.get_relative_center_point()
@@ -110,8 +205,33 @@ class GridConfig:
         self.positionX = self.positionX + moveX
         self.positionY = self.positionY + moveY
 
+    def select_section(self, section):
+        """Zooms into the section, or if the grid is smaller than 25 pixels
+        across, moves the grid one section width in its direction instead.
+        It is moved too if the section is less than COLUMNS pixels across or
+        high, too small to hold the lines.
+
+        """
+        self.select_sections([section])
+
+    def select_sections(self, sections):
+        """Selects the sections in order, see select_section(), computing
+        the axes only for the final size.
+
+        """
+        self.set_geometry(*self.resolve(sections))
+
 
 class TransparentWin(tk.Tk):
+    """A transparent, top most window showing a grid.
+
+    Instead of sleeping for focus to take, refresh() waits for the Map and
+    FocusIn events of the window, up to VISIBLE_TIMEOUT and FOCUS_TIMEOUT
+    seconds, and records how long that took, see get_refresh_timings().
+
+    """
+    VISIBLE_TIMEOUT = 0.2  # Seconds.
+    FOCUS_TIMEOUT = 0.2  # Seconds.
 
     def __init__(self, grid):
         tk.Tk.__init__(self, baseName="")  # baseName replaces argv params.
@@ -127,8 +247,16 @@ class TransparentWin(tk.Tk):
             height=self._grid.height, bg='white',
             bd=-2)  # Border quirk, default border is 2.
         self._canvas.pack()
-        self._monitorNumberItem = None
+        self._create_items()
         self._timestamp = time.time()
+        self.visible = True  # Tracked, so hiding needs no Tk queries.
+        self._mapped = True  # Set by the events, as they arrive.
+        self._focused = False
+        self._eventFlag = tk.IntVar(master=self)  # Written on each event.
+        self.bind("<Map>", lambda event: self._on_map_event(event, True))
+        self.bind("<Unmap>", lambda event: self._on_map_event(event, False))
+        self.bind("<FocusIn>", lambda event: self._on_focus_event(True))
+        self.bind("<FocusOut>", lambda event: self._on_focus_event(False))
 #         self.after(1000, self._timer)
 
 #     def _timer(self):
@@ -140,25 +268,106 @@ class TransparentWin(tk.Tk):
     def get_grid(self):
         return self._grid
 
+    def withdraw(self):
+        self.visible = False
+        self._mapped = False  # Don't wait for the Unmap event to know this.
+        self._focused = False
+        tk.Tk.withdraw(self)
+
     def refresh(self, monitorSelected=False):
         self._timestamp = time.time()
+        start = default_timer()
+        self.visible = True
         self.deiconify()  # Quirk: Secondary window won't refresh without this.
-        self._canvas.delete("all")
         self.wm_geometry(self._grid.get_geometry_string())
         self.draw_grid(monitorSelected)
         self.deiconify()
         self.lift()
-        time.sleep(0.1)  # Pause to allow focus to take.
+        # Focus only takes once the window is mapped.
+        visible = self._wait_for_event(lambda: self._mapped,
+            self.VISIBLE_TIMEOUT)
+        visibleTime = default_timer() - start
         self.focus_force()  # Focus.
         self.focus_set()  # Really focus.
         self.focus()  # Really really focus.
+        focused = self._wait_for_event(lambda: self._focused,
+            self.FOCUS_TIMEOUT)
+        _record_refresh(self._grid.monitorNum, visibleTime,
+            default_timer() - start, visible and focused)
+
+    def _on_map_event(self, event, mapped):
+        if event.widget is self:  # Not the canvas.
+            self._mapped = mapped
+            self._eventFlag.set(1)
+
+    def _on_focus_event(self, focused):
+        self._focused = focused
+        self._eventFlag.set(1)
+
+    def _wait_for_event(self, condition, timeout):
+        """Handles Tk events until condition() is true, or timeout seconds
+        have passed. Returns the final result of condition().
+
+        """
+        deadline = default_timer() + timeout
+        while not condition():
+            remaining = deadline - default_timer()
+            if remaining <= 0:
+                return False
+            timer = self.after(max(int(remaining * 1000), 1),
+                self._eventFlag.set, 1)
+            self.wait_variable(self._eventFlag)
+            self.after_cancel(timer)
+        return True
+
+    def _create_items(self):
+        """Creates all canvas items, hidden. They are only moved and shown
+        or hidden afterwards, never recreated.
+
+        """
+        self._lineItems = []  # Horizontal lines, then vertical lines.
+        for orientation in range(2):  # @UnusedVariable
+            for index in range(GridConfig.COLUMNS + 1):
+                fill = "black"
+                if index % 3:
+                    fill = "gray"
+                self._lineItems.append(self._canvas.create_line(0, 0, 0, 0,
+                    fill=fill))
+        self._sectionItems = []
+        for position in range(1, 10):
+            self._sectionItems.append(self._canvas.create_text(0, 0,
+                text=str(position), font="Arial 10 bold", state=HIDDEN,
+                tags="section"))
+        self._monitorNumberItem = self._canvas.create_text(0, 0,
+            fill="#aaaaaa", text=str(self._grid.monitorNum),
+            font="Arial 100 bold", state=HIDDEN)
+        self._drawnSize = None  # The grid size the items are placed for.
 
     def draw_grid(self, monitorSelected=False):
-        self._draw_lines()
-        if not monitorSelected and self._grid.width == self._grid.monitorWidth:
-            self.draw_monitor_number()
-        elif self._grid.width > 80 and self._grid.height > 80:
+        """Places the items for the current grid size, and shows either the
+        monitor number or the section numbers. The changes are drawn in a
+        single update_idletasks().
+
+        """
+        size = (self._grid.width, self._grid.height)
+        if size != self._drawnSize:  # Moving a grid keeps its size.
+            self._draw_lines()
             self._draw_section_numbers()
+            self.draw_monitor_number()
+            self._drawnSize = size
+        showMonitorNumber = not monitorSelected and \
+            self._grid.width == self._grid.monitorWidth
+        showSectionNumbers = not showMonitorNumber and \
+            self._grid.width > 80 and self._grid.height > 80
+        self._set_visible(self._monitorNumberItem, showMonitorNumber)
+        self._set_visible("section", showSectionNumbers)
+        self.update_idletasks()
+
+    def _set_visible(self, item, visible):
+        if visible:
+            self._canvas.itemconfigure(item, state=NORMAL)
+        else:
+            self._canvas.itemconfigure(item, state=HIDDEN)
 
     def _draw_lines(self):
         minimumX = 0
@@ -167,104 +376,292 @@ class TransparentWin(tk.Tk):
         minimumY = 0
         maximumY = self._grid.height
         axisY = self._grid.axisY
+        items = self._lineItems
         for index, position in enumerate(axisY):
-            fill = "black"
-            if index % 3:
-                fill = "gray"
-            self._canvas.create_line(minimumX, position, maximumX, position,
-                                     fill=fill)
+            self._canvas.coords(items[index], minimumX, position, maximumX,
+                position)
         for index, position in enumerate(axisX):
-            fill = "black"
-            if index % 3:
-                fill = "gray"
-            self._canvas.create_line(position, minimumY, position, maximumY,
-                                     fill=fill)
-        self.update()
+            self._canvas.coords(items[len(axisY) + index], position, minimumY,
+                position, maximumY)
 
     def _draw_section_numbers(self):
         axisX = self._grid.axisX
         axisY = self._grid.axisY
-        position = 1
+        position = 0
         for y in range(3):
             for x in range(3):
-                self._canvas.create_text(
+                self._canvas.coords(self._sectionItems[position],
                     (axisX[(3 * x) + 1] + axisX[(3 * x) + 2]) / 2,
-                    (axisY[(3 * y) + 1] + axisY[(3 * y) + 2]) / 2,
-                    text=str(position), font="Arial 10 bold")
+                    (axisY[(3 * y) + 1] + axisY[(3 * y) + 2]) / 2)
                 position += 1
-        self.update()
 
     def draw_monitor_number(self):
         positionX, positionY = self._grid.get_relative_center_point()
-        self._monitorNumberItem = self._canvas.create_text(positionX,
-            positionY, fill="#aaaaaa", text=str(self._grid.monitorNum),
-            font="Arial 100 bold")
-
-        self.update()
+        self._canvas.coords(self._monitorNumberItem, positionX, positionY)
 
     def exit(self):
         self.destroy()
 
 
-GRID_WINDOWS = {}
+_refreshStats = {}  # Monitor number to [count, visible, focus seconds, fails].
+
+
+def _record_refresh(monitorNum, visibleTime, focusTime, succeeded):
+    stats = _refreshStats.setdefault(monitorNum, [0, 0.0, 0.0, 0])
+    stats[0] += 1
+    stats[1] += visibleTime
+    stats[2] += focusTime
+    if not succeeded:
+        stats[3] += 1
+
+
+def get_refresh_timings():
+    """Returns a dict of monitor number to (refresh count, mean seconds until
+    visible, mean seconds until focused, refreshes that timed out).
+
+    """
+    timings = {}
+    for (monitorNum, (count, visible, focus, fails)) in \
+            _refreshStats.items():
+        timings[monitorNum] = (count, visible / count, focus / count, fails)
+    return timings
+
+
+def print_refresh_timings():
+    """Prints the time grid refreshes took, per monitor."""
+    for (monitorNum, (count, visible, focus, fails)) in sorted(
+            get_refresh_timings().items()):
+        print("Monitor %s: %d refreshes, visible after %.1f ms, focused after"
+            " %.1f ms, %d timed out" % (monitorNum, count, visible * 1000,
+            focus * 1000, fails))
+
+
+# The grid windows are owned by a single UI thread, which creates, draws and
+# hides them, and handles their Tk events. The recognition callbacks below
+# only work on GRIDS, which have no windows, and queue commands for the UI
+# thread with _post(), so they return at once. The windows have grids of
+# their own, which the "show" command moves to the geometry of a callback
+# grid.
+GRIDS = {}  # Monitor index to GridConfig, used by the callbacks.
+GRID_WINDOWS = {}  # Monitor index to TransparentWin, used by the UI thread.
 MONITORS = {}
 MONITOR_SELECTED = None
 MOUSE_MARK_POSITION = None
 
+UI_POLL_INTERVAL = 0.01  # Seconds between Tk updates, while a grid shows.
+UNLOAD_TIMEOUT = 1.0  # Seconds to wait for the UI thread to quit.
+
+_commands = deque()  # (command name, arguments) tuples.
+_commandCondition = threading.Condition()
+_uiThread = None
+_uiBusy = False  # True while the UI thread is running commands.
+
+
+def _create_grid(monitorNumber):
+    """Returns a new grid covering the monitor."""
+    r = MONITORS[str(monitorNumber)].rectMonitor
+    if len(MONITORS) == 1:
+        monitorNum = None
+    else:
+        monitorNum = str(monitorNumber)
+    return GridConfig(positionX=int(r.x), positionY=int(r.y),
+        width=int(r.dx), height=int(r.dy), monitorNum=monitorNum)
+
+
+def _get_grid(monitorNumber):
+    """Returns the grid of the monitor, created if needed."""
+    global GRIDS
+    index = monitorNumber - 1
+    if not index in GRIDS:
+        GRIDS[index] = _create_grid(monitorNumber)
+    return GRIDS[index]
+
+
+def _get_window(monitorNumber):
+    """Returns the grid window of the monitor, created if needed. Only used
+    by the UI thread.
+
+    """
+    global GRID_WINDOWS
+    index = monitorNumber - 1
+    if not index in GRID_WINDOWS:
+        GRID_WINDOWS[index] = TransparentWin(_create_grid(monitorNumber))
+    return GRID_WINDOWS[index]
+
+
+def _post(name, *args):
+    """Queues a command of _COMMANDS for the UI thread, and returns without
+    waiting for it. The UI thread is started by the first command.
+
+    """
+    with _commandCondition:
+        _commands.append((name, args))
+        if _uiThread is None:
+            _start_ui_thread()
+        _commandCondition.notify()
+
+
+def _start_ui_thread():
+    """Starts the UI thread. Called with _commandCondition held."""
+    global _uiThread
+    _uiThread = threading.Thread(target=_ui_loop, name="Grid UI")
+    _uiThread.daemon = True
+    _uiThread.start()
+
+
+def _end_ui_thread(pending):
+    """Called by the UI thread when it quits, with the commands queued after
+    "quit". Only now is _uiThread cleared, so a UI thread that is slow to
+    quit keeps receiving the commands, instead of a second one starting
+    while the windows of the first exist. The pending commands go to a new
+    UI thread.
+
+    """
+    global _uiThread
+    global _uiBusy
+    with _commandCondition:
+        _commands.extendleft(reversed(pending))
+        _uiBusy = False
+        _uiThread = None
+        if _commands:
+            _start_ui_thread()
+        _commandCondition.notifyAll()  # Wake up wait_until_idle().
+
+
+def wait_until_idle(timeout=1.0):
+    """Waits until the UI thread has run all queued commands.
+
+    Returns False if the timeout expired first.
+
+    """
+    deadline = time.time() + timeout
+    with _commandCondition:
+        while _commands or _uiBusy:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            _commandCondition.wait(remaining)
+    return True
+
+
+def _ui_loop():
+    """UI thread, runs the queued commands in order, and handles the Tk
+    events of the windows while any of them is visible. Returns after the
+    "quit" command.
+
+    """
+    global _uiBusy
+    while True:
+        with _commandCondition:
+            _uiBusy = False
+            _commandCondition.notifyAll()  # Wake up wait_until_idle().
+            while not _commands:
+                if _any_window_visible():
+                    _commandCondition.wait(UI_POLL_INTERVAL)
+                    break
+                _commandCondition.wait()
+            commands = list(_commands)
+            _commands.clear()
+            _uiBusy = bool(commands)
+        for (index, (name, args)) in enumerate(commands):
+            try:
+                _COMMANDS[name](*args)
+            except Exception as e:
+                print("Grid command %s failed: %s" % (name, str(e)))
+            if name == "quit":
+                _end_ui_thread(commands[index + 1:])
+                return
+        for win in GRID_WINDOWS.values():
+            if win.visible:
+                win.update()
+
+
+def _any_window_visible():
+    for win in GRID_WINDOWS.values():
+        if win.visible:
+            return True
+    return False
+
+
+def _show_window(monitorNumber, geometry, monitorSelected):
+    """Shows the grid window of the monitor, its grid moved to geometry.
+    Zooming is showing the window again, with the zoomed geometry.
+
+    """
+    win = _get_window(monitorNumber)
+    win.get_grid().set_geometry(*geometry)
+    win.refresh(monitorSelected)
+
+
+def _hide_windows(excludePosition=None):
+    """Hides the visible grid windows, except the one of the monitor
+    excludePosition.
+
+    """
+    for index, win in GRID_WINDOWS.items():
+        if excludePosition and index == excludePosition - 1:
+            continue
+        if win.visible:
+            win.withdraw()
+
+
+def _click(actions):
+    """Hides the grid windows, then executes the Dragonfly actions, so they
+    reach the applications below.
+
+    """
+    _hide_windows()
+    for action in actions:
+        action.execute()
+
+
+def _destroy_windows():
+    global GRID_WINDOWS
+    for win in GRID_WINDOWS.values():
+        win.destroy()
+    GRID_WINDOWS = {}
+
+
+_COMMANDS = {
+    "show": _show_window,  # (monitor number, geometry, monitor selected)
+    "hide": _hide_windows,  # ([monitor number to exclude])
+    "click": _click,  # (list of Dragonfly actions)
+    "quit": _destroy_windows,  # Ends the UI thread.
+}
+
 
 def mouse_grid(pos1=None, pos2=None, pos3=None, pos4=None, pos5=None,
                pos6=None, pos7=None, pos8=None, pos9=None, action=None):
-    """Creates new or reuses grid windows. Can also delegate positioning."""
-    global GRID_WINDOWS
+    """Creates new or reuses grid windows. Can also delegate positioning.
+
+    With an action, e.g. "mouse grid 1 5 3 7 left click", the final position
+    is resolved directly and the action is called, without creating or
+    drawing any window.
+
+    """
     global MONITORS
     global MONITOR_SELECTED
-    # Hide any existing grid windows.
-    for win in GRID_WINDOWS.values():
-        if win.winfo_viewable():
-            win.withdraw()
-#     global POLLING_THREAD
+    _post("hide")
     if len(MONITORS) == 1 and pos1 == None:
         pos1 = 1
     if pos1 and pos1 <= len(MONITORS):
-        index = pos1 - 1
-        monitor = MONITORS[str(pos1)]
         MONITOR_SELECTED = pos1
-        if not index in GRID_WINDOWS.keys():
-            r = monitor.rectMonitor
-            if len(MONITORS) == 1:
-                monitorNum = None
-            else:
-                monitorNum = str(pos1)
-            grid = GridConfig(positionX=int(r.x),
-                positionY=int(r.y), width=int(r.dx), height=int(r.dy),
-                monitorNum=monitorNum)
-            win = TransparentWin(grid)
-            if action == None:
-                win.refresh(MONITOR_SELECTED)
-            GRID_WINDOWS[index] = win
+        grid = _get_grid(pos1)
+        grid.reset()
+        sections = [pos for pos in (pos2, pos3, pos4, pos5, pos6, pos7, pos8,
+            pos9) if pos != None]
+        grid.select_sections(sections)
+        if action:
+            call_action(action, MONITOR_SELECTED)
+            MONITOR_SELECTED = None
         else:
-            win = GRID_WINDOWS[index]
-            win.get_grid().reset()
-            if action == None:
-                win.refresh(MONITOR_SELECTED)
-        if pos2:  # Continue using other given positions.
-            mouse_pos(pos2, pos3, pos4, pos5, pos6, pos7, pos8, pos9,
-                      action=None)
+            _post("show", pos1, grid.get_geometry(), MONITOR_SELECTED)
     else:
         MONITOR_SELECTED = None
-        for index, monitor in MONITORS.items():
-            if not index in GRID_WINDOWS.keys():
-                r = monitor.rectMonitor
-                grid = GridConfig(positionX=int(r.x),
-                    positionY=int(r.y), width=int(r.dx), height=int(r.dy),
-                    monitorNum=str(index))
-                win = TransparentWin(grid)
-                win.refresh(MONITOR_SELECTED)
-                GRID_WINDOWS[int(index) - 1] = win
-            else:
-                win = GRID_WINDOWS[int(index) - 1]
-                win.get_grid().reset()
-                win.refresh(MONITOR_SELECTED)
+        for index in MONITORS.keys():
+            grid = _get_grid(int(index))
+            grid.reset()
+            _post("show", int(index), grid.get_geometry(), MONITOR_SELECTED)
 
 
 def hide_grids(excludePosition=None):
@@ -274,16 +671,9 @@ def hide_grids(excludePosition=None):
     If excludePosition matches the position of a grid, it is not hidden.
 
     """
-    global GRID_WINDOWS
     global MONITOR_SELECTED
-    count = 0
-    for index, win in GRID_WINDOWS.items():
-        if excludePosition and str(excludePosition) == index:
-            continue
-        if win.winfo_viewable():
-            win.withdraw()
-        count += 1
-    if count == len(GRID_WINDOWS):
+    _post("hide", excludePosition)
+    if not excludePosition:
         MONITOR_SELECTED = None
 #         _stop_polling()
 
@@ -295,60 +685,39 @@ def mouse_pos(pos1, pos2=None, pos3=None, pos4=None, pos5=None, pos6=None,
     Takes multiple positions in sequence. If a monitor is not already selected,
     the first position variable is used to select monitor.
     The position variables are treated in sequence to select sections that the
-    grid is moved into.
+    grid is moved into. The final position is resolved directly, and the grid
+    is drawn once, or not at all if an action follows.
 
     """
-    global GRID_WINDOWS
     global MONITOR_SELECTED
     monitorSelected = MONITOR_SELECTED
-    # Hide any existing grid windows.
-    for win in GRID_WINDOWS.values():
-        if win.winfo_viewable():
-            win.withdraw()
+    _post("hide")
     if monitorSelected != None:
         variables = [pos1, pos2, pos3, pos4, pos5, pos6, pos7, pos8, pos9]
-    elif pos1 > len(GRID_WINDOWS):
+    elif pos1 > len(MONITORS):
 #         notify_action_aborted("Monitor number %s out of range." % pos1)
         return
     else:
         variables = [pos2, pos3, pos4, pos5, pos6, pos7, pos8, pos9]
         monitorSelected = pos1
         hide_grids(excludePosition=pos1)
-    win = GRID_WINDOWS[monitorSelected - 1]
     sections = [var for var in variables if var != None]
-    for section in sections:
-        _reposition_grid(win, section)
+    grid = _get_grid(monitorSelected)
+    grid.select_sections(sections)
     if action:
         call_action(action, monitorSelected)
         monitorSelected = None
     else:
-        win.refresh(monitorSelected)
+        _post("show", monitorSelected, grid.get_geometry(), monitorSelected)
     MONITOR_SELECTED = monitorSelected
 
 
-def _reposition_grid(win, section):
-    """Repositions the grid window to a specified section in the grid.
-
-    If the grid is smaller than 25 pixels across, the grid is not repositioned
-    into a section, but instead moved one section width in the direction of
-    the selected section.
-
-    """
-    grid = win.get_grid()
-    if grid.width > 25:
-        grid.recalculate_to_section(section)
-        grid.calculate_axis()
-    else:
-        grid.move_to_section(section)
-
-
 def _init_mouse_action():
     """Gets the selected grid's coordinates, then hides the grid."""
-    global GRID_WINDOWS
     global MONITOR_SELECTED
     if MONITOR_SELECTED != None:
-        win = GRID_WINDOWS[MONITOR_SELECTED - 1]
-        (positionX, positionY) = win.get_grid().get_absolute_centerpoint()
+        grid = _get_grid(MONITOR_SELECTED)
+        (positionX, positionY) = grid.get_absolute_centerpoint()
         # Hide the grid so mouse actions can reach the applications below.
         hide_grids()
         return (positionX, positionY)
@@ -361,7 +730,7 @@ def go():
     """Places the mouse at the grid coordinates. Hides the grid."""
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Mouse("[%s, %s]" % (positionX, positionY))
+        _post("click", [Mouse("[%s, %s]" % (positionX, positionY))])
 
 
 def left_click():
@@ -371,7 +740,7 @@ def left_click():
     """
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Mouse("[%s, %s], left" % (positionX, positionY)).execute()
+        _post("click", [Mouse("[%s, %s], left" % (positionX, positionY))])
 
 
 def right_click():
@@ -381,7 +750,7 @@ def right_click():
     """
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Mouse("[%s, %s], right" % (positionX, positionY)).execute()
+        _post("click", [Mouse("[%s, %s], right" % (positionX, positionY))])
 
 
 def double_click():
@@ -391,7 +760,8 @@ def double_click():
     """
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Mouse("[%s, %s], left:2" % (positionX, positionY)).execute()
+        _post("click", [Mouse("[%s, %s], left:2" % (positionX,
+            positionY))])
 
 
 def control_click():
@@ -401,9 +771,9 @@ def control_click():
     """
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Key("ctrl:down/5").execute()
-        Mouse("[%s, %s], left" % (positionX, positionY)).execute()
-        Key("ctrl:up/5").execute()
+        _post("click", [Key("ctrl:down/5"),
+            Mouse("[%s, %s], left" % (positionX, positionY)),
+            Key("ctrl:up/5")])
 
 
 def shift_click():
@@ -413,9 +783,9 @@ def shift_click():
     """
     (positionX, positionY) = _init_mouse_action()
     if positionX != None and positionY != None:
-        Key("shift:down/5").execute()
-        Mouse("[%s, %s], left" % (positionX, positionY)).execute()
-        Key("shift:up/5").execute()
+        _post("click", [Key("shift:down/5"),
+            Mouse("[%s, %s], left" % (positionX, positionY)),
+            Key("shift:up/5")])
 
 
 def mouse_mark():
@@ -442,7 +812,7 @@ def mouse_drag():
         (targetX, targetY) = _init_mouse_action()
         mouseString = "[%s, %s], left:down/10, [%s, %s], left:up/10" % (startX,
             startY, targetX, targetY)
-        Mouse(mouseString).execute()
+        _post("click", [Mouse(mouseString)])
         MOUSE_MARK_POSITION = None
     else:
         print("Mouse drag failed, no start position marked.")
@@ -463,12 +833,18 @@ def call_action(action, monitorSelected):
 
 
 def unload():
-    global MONITORS
-    global GRID_WINDOWS
-    for win in GRID_WINDOWS.values():
-        win.destroy()
-        win = None
-    MONITORS = None
+    """Destroys the grid windows and ends the UI thread. The monitors are
+    kept, since they are only enumerated when this module is imported.
+
+    """
+    global GRIDS
+    thread = _uiThread
+    if thread is not None:
+        _post("quit")
+        # The thread clears _uiThread itself when it has quit. If it is still
+        # busy, commands keep going to it instead of to a second UI thread.
+        thread.join(UNLOAD_TIMEOUT)
+    GRIDS = {}
 
 
 # ----------------------------------------------------------------------------
@@ -569,5 +945,88 @@ def __run__():
     win.mainloop()  # Needed to handle internal events.
 
 
+def _benchmark_drill_down(count=10000, levels=(2, 8), seed=1):
+    """Drives count random drill downs, like "grid 5 3 7 2", on a grid
+    without a window, and prints the cost per step.
+
+    """
+    rng = random.Random(seed)
+    commands = [[rng.randint(1, 9) for i in range(rng.randint(*levels))]
+        for j in range(count)]  # @UnusedVariable
+    grid = GridConfig(positionX=0, positionY=0, width=1920, height=1080)
+    steps = 0
+    start = default_timer()
+    for sections in commands:
+        grid.reset()
+        for section in sections:
+            grid.select_section(section)
+        grid.get_absolute_centerpoint()
+        steps += len(sections)
+    elapsed = default_timer() - start
+    print("%d drill downs, %d steps, %.2f us per step, %d cached sizes" % (
+        count, steps, elapsed / steps * 1e6, len(GridConfig._geometryCache)))
+
+
+def _benchmark_redraw(levels=5, repeat=20):
+    """Zooms a window's grid in levels times, and prints the time per redraw
+    at each zoom level, compared with deleting and recreating all items.
+    Needs a display.
+
+    """
+    grid = GridConfig(positionX=0, positionY=0, width=1920, height=1080,
+        monitorNum="1")
+    win = TransparentWin(grid)
+    try:
+        for level in range(levels + 1):
+            if level:
+                grid.select_section(5)
+            start = default_timer()
+            for i in range(repeat):  # @UnusedVariable
+                win._drawnSize = None  # Force moving all items.
+                win.draw_grid()
+            incremental = (default_timer() - start) / repeat
+            start = default_timer()
+            for i in range(repeat):  # @UnusedVariable
+                win._canvas.delete("all")
+                win._create_items()
+                win.draw_grid()
+            recreated = (default_timer() - start) / repeat
+            print("Level %d, %dx%d: redraw %.2f ms, recreate %.2f ms" % (
+                level, grid.width, grid.height, incremental * 1000,
+                recreated * 1000))
+    finally:
+        win.destroy()
+
+
+def _benchmark_callbacks(count=100, seed=1):
+    """Drives count random drill downs through the recognition callbacks,
+    and prints how long the callbacks took to return, and how long the UI
+    thread took to draw the grids after them. Needs a display.
+
+    """
+    rng = random.Random(seed)
+    timings = []
+    start = default_timer()
+    for i in range(count):  # @UnusedVariable
+        callbackStart = default_timer()
+        mouse_grid(1)
+        timings.append(default_timer() - callbackStart)
+        for j in range(rng.randint(1, 4)):  # @UnusedVariable
+            callbackStart = default_timer()
+            mouse_pos(rng.randint(1, 9))
+            timings.append(default_timer() - callbackStart)
+    queued = default_timer() - start
+    idle = wait_until_idle(timeout=count * 2.0)
+    drawn = default_timer() - start
+    print("%d callbacks, mean %.1f us, max %.1f us, queued in %.2f s, drawn "
+        "in %.2f s%s" % (len(timings), sum(timings) / len(timings) * 1e6,
+        max(timings) * 1e6, queued, drawn, "" if idle else " (timed out)"))
+    hide_grids()
+    unload()
+
+
 if __name__ == '__main__':
+    _benchmark_drill_down()
+    _benchmark_callbacks()
+    _benchmark_redraw()
     __run__()
@@ -0,0 +1,140 @@
+"""A support module for managing sys.path, and for profiling imports.
+
+Paths are added to sys.path in a canonical form, only once, and by default at
+the end, so they never shadow the standard library or site-packages.
+
+The import profiler wraps the builtin __import__ and records how long each
+module took to import, both including and excluding the modules it imported
+in turn. Run this module from the MacroSystem directory, in a Python with
+Natlink and Dragonfly available, to profile loading every command module:
+    python -m lib.importpath
+
+-----------------------------------------------------------------------------
+Licensed under LGPL3
+
+"""
+import os
+import sys
+import __builtin__
+from timeit import default_timer
+
+WORKING_PATH = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
+
+_originalImport = None
+_importTimes = {}  # Module name to [inclusive seconds, exclusive seconds].
+_childTimes = []  # Stack of time spent in nested imports, per active import.
+
+
+def canonical_path(path):
+    """Returns the absolute, normalized form of path, used for comparisons."""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def add_path(path, position=None):
+    """Adds path to sys.path, unless it is already there in any form.
+
+    The path is appended, unless position is given. Returns True if the path
+    was added.
+
+    """
+    if not isinstance(path, basestring):
+        raise TypeError("Path must be a string, not %r." % (path,))
+    canonical = canonical_path(path)
+    for entry in sys.path:
+        if isinstance(entry, basestring) and canonical_path(entry) == \
+                canonical:
+            return False
+    if position is None:
+        sys.path.append(os.path.abspath(path))
+    else:
+        sys.path.insert(position, os.path.abspath(path))
+    return True
+
+
+def start_profile():
+    """Starts recording the time spent importing each module."""
+    global _originalImport
+    if _originalImport is not None:
+        return
+    _originalImport = __builtin__.__import__
+    __builtin__.__import__ = _profiled_import
+
+
+def stop_profile():
+    """Stops recording imports. The recorded times are kept."""
+    global _originalImport
+    if _originalImport is None:
+        return
+    __builtin__.__import__ = _originalImport
+    _originalImport = None
+
+
+def _profiled_import(name, *args, **kwargs):
+    """Replacement for __import__, records the time of imports that load
+    new modules.
+
+    """
+    if name in sys.modules:  # Fast path, already imported.
+        return _originalImport(name, *args, **kwargs)
+    moduleCount = len(sys.modules)
+    _childTimes.append(0.0)
+    start = default_timer()
+    try:
+        return _originalImport(name, *args, **kwargs)
+    finally:
+        elapsed = default_timer() - start
+        childTime = _childTimes.pop()
+        if _childTimes:
+            _childTimes[-1] += elapsed
+        if len(sys.modules) > moduleCount:
+            times = _importTimes.setdefault(name, [0.0, 0.0])
+            times[0] += elapsed
+            times[1] += elapsed - childTime
+
+
+def get_profile():
+    """Returns a list of (module name, inclusive seconds, exclusive seconds),
+    most expensive first.
+
+    """
+    profile = [(name, inclusive, exclusive) for (name, (inclusive,
+        exclusive)) in _importTimes.items()]
+    profile.sort(key=lambda entry: entry[1], reverse=True)
+    return profile
+
+
+def print_profile(limit=30):
+    """Prints the most expensive imports recorded."""
+    print("%-40s %12s %12s" % ("Module", "Total (ms)", "Self (ms)"))
+    for (name, inclusive, exclusive) in get_profile()[:limit]:
+        print("%-40s %12.2f %12.2f" % (name, inclusive * 1000,
+            exclusive * 1000))
+
+
+def profile_macro_system(path=WORKING_PATH):
+    """Imports every command module in the MacroSystem directory, the way
+    Natlink does, and returns the total time in seconds.
+
+    """
+    add_path(path)
+    moduleNames = sorted(fileName[:-3] for fileName in os.listdir(path)
+        if fileName.startswith("_") and fileName.endswith(".py") and
+        not fileName.startswith("__"))
+    start_profile()
+    start = default_timer()
+    try:
+        for moduleName in moduleNames:
+            try:
+                __import__(moduleName)
+            except Exception as e:
+                print("Could not import %s: %s" % (moduleName, str(e)))
+    finally:
+        total = default_timer() - start
+        stop_profile()
+    return total
+
+
+if __name__ == "__main__":
+    total = profile_macro_system()
+    print_profile()
+    print("Total MacroSystem load: %.2f ms" % (total * 1000))
@@ -0,0 +1,242 @@
+"""A golden output harness for lib.text and lib.format.
+
+A deterministic corpus of dictation strings is generated from a seed, and
+every string is run through the translation and formatting functions, using
+the RecordingBackend of lib.backend, so no keyboard is needed. SCText and
+NTText are covered through the functions they are built on, since their
+Dragonfly base class needs Windows. Every style of lib.format.STYLES is
+covered, both for dictated text and for text in an editor: the *_count
+functions find each string in the editor text of the backend, and reformat
+all its words. They run twice, once with text access, and once with the
+*_clipboard suffix, without it, which selects and cuts the words and pastes
+or types the result through the emulated clipboard of the editor. Each log
+ends with the final editor text. The settings the output depends on are set
+to their SCHEMA defaults while the corpus runs. The recorded output is
+compared with the golden file resources/golden/dictation.json, which holds
+the full output for the first SAMPLE_COUNT strings, one per line, and a
+digest per CHUNK_SIZE strings for the rest. The time per function is reported
+too, so the harness doubles as a benchmark of the hot paths.
+
+Run from the MacroSystem directory:
+    python -m lib.replay            Compares the output with the golden file.
+    python -m lib.replay --record   Rewrites the golden file.
+
+-----------------------------------------------------------------------------
+Licensed under LGPL3
+
+"""
+import os
+import sys
+import json
+import random
+import hashlib
+from timeit import default_timer
+
+import lib.backend
+import lib.config
+import lib.text
+import lib.format
+
+WORKING_PATH = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
+GOLDEN_PATH = os.path.join(WORKING_PATH, "resources/golden/dictation.json")
+SEED = 1
+COUNT = 2000
+CHUNK_SIZE = 100
+SAMPLE_COUNT = 10
+SC_TEXT_SPEC = "svn commit -m %(text)s"
+NT_TEXT_SPEC = "echo %(text)s"
+# Config name to the settings attribute pinned to its default during a run.
+PINNED_SETTINGS = {
+    "format.paste_threshold": "format_paste_threshold",
+    "text.bulk_threshold": "text_bulk_threshold",
+}
+
+VOCABULARY = ["my", "new", "variable", "file", "path", "name", "Get", "user",
+    "index", "HTML", "value", "list", "item", "count", "self", "data",
+    "config", "json", "x", "a", "to", "of", "the", "100%", "it's"]
+
+
+class DictationResult(object):
+    """Stands in for a Dragonfly dictation result."""
+    def __init__(self, text):
+        self.words = text.split(" ")
+        self._text = text
+
+    def __str__(self):
+        return self._text
+
+
+def _text_function(style):
+    return lambda text: lib.format.format_text(style, DictationResult(text))
+
+
+def _count_function(function):
+    return lambda text: function(len(text.split(" ")))
+
+
+def _style_count_function(style):
+    return _count_function(lambda n: lib.format.format_count(style, n))
+
+
+def _sc_text(text):
+    """Types text like SCText(SC_TEXT_SPEC) with text as its variable."""
+    data = lib.text.translate_variables({"text": text},
+        lib.text.compile_template(SC_TEXT_SPEC))
+    lib.text.insert_text(SC_TEXT_SPEC % data)
+
+
+def _nt_text(text):
+    """Types text like NTText(NT_TEXT_SPEC) with text as its variable."""
+    lib.text.insert_text(lib.text.translate_normal_text(NT_TEXT_SPEC %
+        {"text": text}))
+
+
+# Name, function and whether the editor allows text access.
+FUNCTIONS = [
+    ("special", lambda text: lib.text.insert_text(
+        lib.text.translate_special_characters(text)), True),
+    ("normal", lambda text: lib.text.insert_text(
+        lib.text.translate_normal_text(text)), True),
+    ("sc_text", _sc_text, True),
+    ("nt_text", _nt_text, True),
+    ("expand_count", _count_function(lib.format.expand_count), True),
+    ("expand_count_clipboard", _count_function(lib.format.expand_count),
+        False),
+]
+for style in sorted(lib.format.STYLES):
+    FUNCTIONS.append((style, _text_function(style), True))
+    FUNCTIONS.append((style + "_count", _style_count_function(style), True))
+    FUNCTIONS.append((style + "_count_clipboard",
+        _style_count_function(style), False))
+
+
+def generate_corpus(seed=SEED, count=COUNT):
+    """Returns a list of count dictation strings, the same for a seed."""
+    rng = random.Random(seed)
+    words = VOCABULARY + sorted(lib.text.specialCharacterTranslations.keys())
+    corpus = []
+    for i in range(count):  # @UnusedVariable
+        length = rng.randint(1, 8)
+        corpus.append(" ".join([rng.choice(words) for j in range(length)]))
+    return corpus
+
+
+def run_corpus(corpus):
+    """Runs the corpus through all functions.
+
+    Returns a dict of function name to a list of recorded logs, and a dict
+    of function name to seconds spent.
+
+    """
+    outputs = {}
+    timings = {}
+    previous = lib.backend.get_backend()
+    settings = lib.config.get_settings()
+    savedSettings = {}
+    for (name, attribute) in PINNED_SETTINGS.items():
+        savedSettings[attribute] = getattr(settings, attribute)
+        setattr(settings, attribute, lib.config.SCHEMA[name][1])
+    try:
+        for (name, function, textAccess) in FUNCTIONS:
+            logs = []
+            elapsed = 0.0
+            for text in corpus:
+                backend = lib.backend.RecordingBackend(editorText=text,
+                    textAccess=textAccess)
+                lib.backend.set_backend(backend)
+                start = default_timer()
+                function(text)
+                elapsed += default_timer() - start
+                logs.append(backend.log + [("editor", backend.editorText)])
+            outputs[name] = logs
+            timings[name] = elapsed
+    finally:
+        lib.backend.set_backend(previous)
+        for (attribute, value) in savedSettings.items():
+            setattr(settings, attribute, value)
+    return (outputs, timings)
+
+
+def _digest(logs):
+    return hashlib.md5(json.dumps(logs)).hexdigest()
+
+
+def summarize(outputs):
+    """Returns the golden data for the outputs of run_corpus()."""
+    golden = {"seed": SEED, "count": COUNT, "functions": {}}
+    for (name, logs) in outputs.items():
+        golden["functions"][name] = {
+            "samples": logs[:SAMPLE_COUNT],
+            "digests": [_digest(logs[start:start + CHUNK_SIZE]) for start in
+                range(0, len(logs), CHUNK_SIZE)],
+        }
+    return golden
+
+
+def write_golden(golden, f):
+    """Writes the golden data as JSON, with one line per sample log and one
+    line for the digests of each function, so the file stays short and a
+    diff shows the samples that changed.
+
+    """
+    f.write('{\n "count": %s,\n "seed": %s,\n "functions": {\n' % (
+        json.dumps(golden["count"]), json.dumps(golden["seed"])))
+    names = sorted(golden["functions"].keys())
+    for name in names:
+        entry = golden["functions"][name]
+        f.write('  %s: {\n   "digests": %s,\n   "samples": [\n' % (
+            json.dumps(name), json.dumps(entry["digests"])))
+        f.write(",\n".join(["    " + json.dumps(logs) for logs in
+            entry["samples"]]))
+        f.write("\n   ]\n  }%s\n" % ("," if name != names[-1] else ""))
+    f.write(" }\n}\n")
+
+
+def compare(golden, outputs, corpus):
+    """Compares outputs with the golden data. Returns a list of messages
+    describing the differences.
+
+    """
+    differences = []
+    for (name, logs) in sorted(outputs.items()):
+        expected = golden["functions"].get(name)
+        if expected is None:
+            differences.append("%s: No golden output." % name)
+            continue
+        actualSamples = json.loads(json.dumps(logs[:SAMPLE_COUNT]))
+        for index, (actual, sample) in enumerate(zip(actualSamples,
+                expected["samples"])):
+            if actual != sample:
+                differences.append("%s: %r gave %r, expected %r" % (name,
+                    corpus[index], actual, sample))
+        for chunk, digest in enumerate(expected["digests"]):
+            start = chunk * CHUNK_SIZE
+            if _digest(logs[start:start + CHUNK_SIZE]) != digest:
+                differences.append("%s: Output differs for strings %d-%d." % (
+                    name, start, start + CHUNK_SIZE - 1))
+    return differences
+
+
+def main(record=False):
+    corpus = generate_corpus()
+    (outputs, timings) = run_corpus(corpus)
+    for (name, function, textAccess) in FUNCTIONS:  # @UnusedVariable
+        print("%-26s %7.1f us per string" % (name,
+            timings[name] / len(corpus) * 1e6))
+    if record:
+        with open(GOLDEN_PATH, "w") as f:
+            write_golden(summarize(outputs), f)
+        print("Golden output recorded to %s" % GOLDEN_PATH)
+        return True
+    with open(GOLDEN_PATH, "r") as f:
+        golden = json.load(f)
+    differences = compare(golden, outputs, corpus)
+    for difference in differences:
+        print(difference)
+    print("%d strings, %d functions, %d differences" % (len(corpus),
+        len(FUNCTIONS), len(differences)))
+    return not differences
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(record="--record" in sys.argv) else 1)
@@ -1,12 +1,33 @@
 """A support module for Dragonfly command modules, for playing sounds.
 
+All sound files in the resources/sound directory are read into memory when
+this module is imported, and played from memory, so playing a sound never
+touches the disk. Other sound files are read on their first use, then kept.
+
+The actual playing is done by a backend, selected when the first sound is
+played: WindowsBackend on Windows, AplayBackend where the ALSA aplay command
+is available, otherwise NullBackend, which plays nothing. RecordingBackend
+remembers the played sounds instead, for testing. Use set_backend() to
+switch. The modules a backend needs are imported when it is created, by the
+playback thread, so importing this module stays cheap.
+
+play() never blocks: it puts the sound in a bounded queue, which a playback
+thread works through. Since playing a sound interrupts the previous one, the
+thread only plays the latest sound of a burst, skips a sound identical to the
+one it played less than COALESCE_WINDOW seconds ago, and drops sounds that
+have waited longer than STALE_AFTER seconds.
+
 -----------------------------------------------------------------------------
 Licensed under the LGPL, see http://www.gnu.org/licenses/
 
 """
 
 import os
-import winsound
+import sys
+import time
+import threading
+from collections import deque
+from timeit import default_timer
 
 
 WORKING_PATH = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
@@ -19,6 +40,138 @@ SND_ERROR = os.path.join(SOUND_PATH, "error.wav")
 SND_WARNING = os.path.join(SOUND_PATH, "warning.wav")
 SND_DING = os.path.join(SOUND_PATH, "ding.wav")
 
+SOUND_BANK = {}  # Sound file path to the contents of the file.
+QUEUE_SIZE = 8  # The oldest sounds are dropped when the queue is full.
+COALESCE_WINDOW = 0.3  # Seconds, identical sounds within it are played once.
+STALE_AFTER = 1.0  # Seconds, sounds not played by then are dropped.
+
+_queue = deque(maxlen=QUEUE_SIZE)  # (queue time, sound, data) tuples.
+_queueCondition = threading.Condition()
+_playThread = None
+_busy = False  # True while the playback thread is handling sounds.
+
+
+class WindowsBackend(object):
+    """Plays sounds from memory, asynchronously, through the Windows API.
+
+    The winsound module refuses to play from memory asynchronously, since it
+    can't keep the buffer alive. The sound bank keeps every buffer alive, so
+    PlaySound is called directly instead.
+
+    """
+    SND_ASYNC = 0x0001
+    SND_NODEFAULT = 0x0002
+    SND_MEMORY = 0x0004
+
+    def __init__(self):
+        import ctypes
+        self._playSound = ctypes.windll.winmm.PlaySoundA
+
+    def play(self, sound, data):  # @UnusedVariable
+        flags = self.SND_MEMORY | self.SND_NODEFAULT | self.SND_ASYNC
+        self._playSound(data, None, flags)
+
+
+class AplayBackend(object):
+    """Plays sounds by piping the WAV data to the ALSA aplay command.
+
+    A new sound stops the one playing, like on Windows.
+
+    """
+    def __init__(self, command="aplay"):
+        import subprocess
+        self._subprocess = subprocess
+        self._command = command
+        self._process = None
+        self._devnull = open(os.devnull, "w")
+
+    def play(self, sound, data):  # @UnusedVariable
+        self.stop()
+        process = self._subprocess.Popen([self._command, "-q", "-"],
+            stdin=self._subprocess.PIPE, stdout=self._devnull,
+            stderr=self._devnull)
+        self._process = process
+        # aplay reads the data as it plays, so don't wait for it here.
+        writer = threading.Thread(target=self._write, args=(process, data),
+            name="Sound writer")
+        writer.daemon = True
+        writer.start()
+
+    def stop(self):
+        """Stops the sound that is currently playing, if any."""
+        process = self._process
+        self._process = None
+        if process is not None and process.poll() is None:
+            try:
+                process.terminate()
+            except OSError:
+                pass  # Already finished.
+
+    def _write(self, process, data):
+        try:
+            process.stdin.write(data)
+            process.stdin.close()
+        except (IOError, OSError):
+            pass  # Stopped by a newer sound.
+        process.wait()
+
+
+class NullBackend(object):
+    """Plays nothing."""
+    def play(self, sound, data):
+        pass
+
+
+class RecordingBackend(object):
+    """Plays nothing, but keeps a list of the sounds played."""
+    def __init__(self):
+        self.played = []
+
+    def play(self, sound, data):  # @UnusedVariable
+        self.played.append(sound)
+
+
+def set_backend(backend):
+    """Sets the backend used to play sounds. Returns the previous one, or
+    None if no sound was played yet.
+
+    """
+    global BACKEND
+    previous = BACKEND
+    BACKEND = backend
+    return previous
+
+
+def _get_backend():
+    """Returns the backend, selected on first use."""
+    global BACKEND
+    if BACKEND is None:
+        BACKEND = _select_backend()
+    return BACKEND
+
+
+def load_sound(sound):
+    """Reads a sound file into the sound bank, and returns its contents.
+
+    Returns None if the file can not be read.
+
+    """
+    try:
+        with open(sound, "rb") as f:
+            data = f.read()
+    except IOError:
+        print("* Sound error: File not found '%s'. *" % sound)
+        return None
+    SOUND_BANK[sound] = data
+    return data
+
+
+def load_sounds(path=SOUND_PATH):
+    """Reads all sound files in path into the sound bank."""
+    for fileName in os.listdir(path):
+        if fileName.lower().endswith(".wav"):
+            load_sound(os.path.join(path, fileName))
+
 
 def play(sound):
     """Plays the specified sound file, asynchronously.
@@ -28,14 +181,111 @@ def play(sound):
     If the sound file is not found, no exception is raised.
 
     """
-    flags = winsound.SND_FILENAME | winsound.SND_NODEFAULT | winsound.SND_ASYNC
-    if not os.path.isfile(sound):
-        print("* Sound error: File not found '%s'. *" % sound)
-    winsound.PlaySound(sound, flags)
+    global _playThread
+    data = SOUND_BANK.get(sound)
+    if data is None:
+        data = load_sound(sound)
+        if data is None:
+            return
+    with _queueCondition:
+        _queue.append((time.time(), sound, data))
+        if _playThread is None:
+            _playThread = threading.Thread(target=_play_loop,
+                name="Sound player")
+            _playThread.daemon = True
+            _playThread.start()
+        _queueCondition.notify()
+
+
+def wait_until_played(timeout=1.0):
+    """Waits until the playback thread has handled all queued sounds.
+
+    Returns False if the timeout expired first.
+
+    """
+    deadline = time.time() + timeout
+    with _queueCondition:
+        while _queue or _busy:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            _queueCondition.wait(remaining)
+    return True
+
+
+def _play_loop():
+    """Background thread, plays the latest queued sound."""
+    global _busy
+    lastSound = None
+    lastPlayed = 0.0
+    while True:
+        with _queueCondition:
+            _busy = False
+            _queueCondition.notifyAll()  # Wake up wait_until_played().
+            while not _queue:
+                _queueCondition.wait()
+            (queued, sound, data) = _queue.pop()  # Latest sound only.
+            _queue.clear()  # Would be interrupted by the latest anyway.
+            _busy = True
+        now = time.time()
+        if now - queued > STALE_AFTER:
+            continue
+        if sound == lastSound and now - lastPlayed < COALESCE_WINDOW:
+            continue
+        lastSound = sound
+        lastPlayed = now
+        try:
+            _get_backend().play(sound, data)
+        except Exception as e:
+            print("* Sound error: %s *" % str(e))
+
+
+def _benchmark_play(count=1000):
+    """Measures the time a caller spends per play() call."""
+    previous = set_backend(RecordingBackend())
+    try:
+        timings = []
+        for i in range(count):
+            sound = (SND_ACTIVATE, SND_DEACTIVATE)[i % 2]
+            start = default_timer()
+            play(sound)
+            timings.append(default_timer() - start)
+        wait_until_played()
+        print("play() mean %.1f us, max %.1f us, %d of %d played" % (
+            sum(timings) / count * 1e6, max(timings) * 1e6,
+            len(BACKEND.played), count))
+    finally:
+        set_backend(previous)  # None selects again on the next sound.
+
+
+def _find_executable(name):
+    """Returns the full path of the named program on PATH, or None."""
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def _select_backend():
+    """Returns the best backend available on this system."""
+    try:
+        if sys.platform == "win32":
+            return WindowsBackend()
+        aplayPath = _find_executable("aplay")
+        if aplayPath:
+            return AplayBackend(aplayPath)
+    except Exception as e:
+        print("* Sound error: No sound backend available: %s *" % str(e))
+    return NullBackend()
+
+
+BACKEND = None  # Selected by the playback thread, see _get_backend().
+load_sounds()
 
 
 if __name__ == "__main__":
-    import time
+    _benchmark_play()
     play(SND_ACTIVATE)
     time.sleep(3)
     play(SND_DEACTIVATE)
@@ -1,12 +1,62 @@
+"""A support module for Dragonfly command modules, for typing text with
+dictated special characters.
+
+Dictated special characters, like "/\\slash", are replaced using the
+translation tables below. Each table is compiled once, at import, into a
+single regular expression with the longest words first, so a text is
+translated in one pass with the same result regardless of dict order.
+
+The keyboard events for each typed word are cached, so the words of repeated
+commands like "svn commit -m" are only encoded once.
+
+BulkText, SCText and NTText type their final text with insert_text(), which
+encodes and sends it one word at a time, so the first word is typed before
+the rest is encoded.
+
+SCText supports any number of %(name)s variables. The variable names of a
+spec are parsed once, and the translation is applied to each variable's value
+by translate_variables() before the spec is formatted, so the whole text is
+typed as one action.
+
+Texts of at least text.bulk_threshold characters (see lib.config) are not
+typed key by key, but inserted in bulk by inject_text(), using the strategy
+in BULK_STRATEGIES for the foreground application:
+ - "paste": Via the clipboard, which is restored afterwards.
+ - "unicode": As one batch of unicode SendInput events.
+ - "keys": Key by key, like shorter texts.
+
+"""
 import re
+import time
+from timeit import default_timer
 
-from dragonfly import Text  # @UnusedImport
-from dragonfly.actions.keyboard import Keyboard
+try:
+    from dragonfly import Text  # @UnusedImport
+except ImportError:  # No Dragonfly, only the functions work, see lib.backend.
+    Text = object
 
 import lib.config
-config = lib.config.get_config()
-if config.get("aenea.enabled", False) == True:
+import lib.backend
+settings = lib.config.get_settings()
+if settings.aenea_enabled:
     from proxy_nicknames import Text  # @Reimport
+# Fixed at import time, to always match the Text class imported above. The
+# classes below derive from it, so a change of aenea.enabled needs a reload.
+aeneaEnabled = settings.aenea_enabled
+
+# Executable name, lower case without extension, to bulk insertion strategy.
+BULK_STRATEGIES = {
+    "putty": "unicode",  # Pastes with shift+insert or right click.
+    "mintty": "unicode",
+    # Console windows belong to conhost.exe, or to csrss.exe before Windows 7,
+    # not to the shell running in them.
+    "conhost": "unicode",
+    "csrss": "unicode",
+    "console": "unicode",
+    "natspeak": "keys",
+}
+DEFAULT_BULK_STRATEGY = "paste"
+PASTE_DELAY = 0.05  # Seconds for the application to read the clipboard.
 
 
 specialCharacterTranslations = {
@@ -36,42 +86,306 @@ specialCharacterTranslations = {
     "=\\equals-sign": "=",
     "+\\plus-sign": "+",
     "-\\minus-sign": "-",
-    "--\dash": "-",
-    "-\hyphen": "-",
-    "\"\right-double-quote": "\"",
-    "\"\left-double-quote": "\"",
+    "--\\dash": "-",
+    "-\\hyphen": "-",
+    "\"\\right-double-quote": "\"",
+    "\"\\left-double-quote": "\"",
 }
 
 
-class SCText(Text):  # Special Characters Text.
+_wordPattern = re.compile(r"\s*\S+\s*|\s+")
+
+
+class Translator(object):
+    """Replaces all dictated words in a text, in one pass. A single space on
+    either side of a word is removed with it.
+
+    """
+    def __init__(self, translations):
+        self._lookup = translations.__getitem__
+        words = sorted(translations.keys(), key=len, reverse=True)
+        self._pattern = re.compile(" ?(%s) ?" % "|".join([re.escape(word)
+            for word in words]))
+
+    def __call__(self, text):
+        return self._pattern.sub(self._replace, text)
+
+    def _replace(self, match):
+        return self._lookup(match.group(1))
+
+
+def compile_translations(translations):
+    """Returns a Translator for the translations."""
+    return Translator(translations)
+
+
+def iter_words(text):
+    """Yields the words of text, each with its surrounding whitespace."""
+    for match in _wordPattern.finditer(text):
+        yield match.group()
+
+
+translate_special_characters = compile_translations(
+    specialCharacterTranslations)
+_variablePattern = re.compile(r"%\(([a-z_0-9]+)\)s")
+_templateCache = {}  # Spec to tuple of variable names.
+
+
+def compile_template(spec):
+    """Returns the names of the %(name)s variables in spec, cached."""
+    names = _templateCache.get(spec)
+    if names is None:
+        names = tuple(_variablePattern.findall(spec or ""))
+        _templateCache[spec] = names
+    return names
+
+
+class LruCache(object):
+    """A bounded cache that discards the least recently used entries.
+
+    When full, the least recently used quarter of the entries is discarded
+    in one go, which keeps the cost per lookup constant on average.
+
+    """
+    def __init__(self, maxSize=256):
+        self._maxSize = maxSize
+        self._entries = {}  # Key to [value, last use].
+        self._clock = 0
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._clock += 1
+        entry[1] = self._clock
+        return entry[0]
+
+    def put(self, key, value):
+        if len(self._entries) >= self._maxSize and not key in self._entries:
+            self._evict()
+        self._clock += 1
+        self._entries[key] = [value, self._clock]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        uses = sorted([entry[1] for entry in self._entries.values()])
+        limit = uses[len(uses) // 4]
+        for key, entry in self._entries.items():
+            if entry[1] <= limit:
+                del self._entries[key]
+
+
+# (text, pause, backend, id of specials) to tuple of events.
+_eventCache = LruCache(maxSize=512)
+
+
+def encode_text(text, pause, specials={}):
+    """Returns the keyboard events for typing text, as a tuple.
+
+    Characters in specials are typed with the typeable given there. The
+    result is cached by text, pause and specials. The specials are told
+    apart by identity, so they must be long lived tables that don't change,
+    like the default one and Text._specials.
+
+    """
+    backend = lib.backend.get_backend()
+    key = (text, pause, backend, id(specials))
+    events = _eventCache.get(key)
+    if events is None:
+        get_typeable = backend.get_typeable
+        eventList = []
+        for character in text:
+            if character in specials:
+                typeable = specials[character]
+            else:
+                typeable = get_typeable(character)
+            eventList.extend(typeable.events(pause))
+        events = tuple(eventList)
+        _eventCache.put(key, events)
+    return events
+
+
+class BulkText(Text):
+    """Text action that types its text with insert_text(), so it is streamed
+    word by word, or inserted in bulk if it is long.
+
+    """
     def _parse_spec(self, spec):
+        return spec  # Handled by _execute_events().
+
+    def _execute_events(self, events):
+        if aeneaEnabled:  # The spec is sent to the server as it is.
+            return Text._execute_events(self, events)
+        insert_text(events, self._pause, self._specials)
+        return True
+
+
+def insert_text(text, pause=0, specials={}):
+    """Types text word by word through send_stream(), or inserts it in bulk
+    with inject_text() if it has at least text.bulk_threshold characters and
+    the foreground application has a bulk strategy other than "keys".
+
+    """
+    if len(text) >= settings.text_bulk_threshold:
+        strategy = get_bulk_strategy()
+        if strategy != "keys":
+            inject_text(text, strategy)
+            return
+    send_stream(iter_words(text), pause, specials)
+
+
+def get_bulk_strategy():
+    """Returns the bulk insertion strategy for the foreground application."""
+    try:
+        executable = lib.backend.get_backend().get_foreground_executable()
+    except Exception:
+        return DEFAULT_BULK_STRATEGY
+    name = executable.replace("\\", "/").split("/")[-1].lower()
+    if name.endswith(".exe"):
+        name = name[:-4]
+    return BULK_STRATEGIES.get(name, DEFAULT_BULK_STRATEGY)
+
+
+def inject_text(text, strategy=None):
+    """Inserts text in the foreground application with the given strategy,
+    by default the one for the application.
+
+    """
+    if strategy is None:
+        strategy = get_bulk_strategy()
+    if strategy == "unicode":
+        send_unicode_text(text)
+    elif strategy == "paste":
+        paste_text(text)
+    else:
+        send_stream(iter_words(text))
+
+
+def send_stream(words, pause=0, specials={}):
+    """Encodes and sends each word from an iterable, before taking the next.
+
+    """
+    backend = lib.backend.get_backend()
+    for word in words:
+        backend.send_events(encode_text(word, pause, specials))
+
+
+def paste_text(text, restore=True):
+    """Inserts text by pasting it, then restores all the clipboard contents.
+
+    Callers that saved the clipboard themselves, before using it for
+    something else, pass restore=False and restore it when done.
+
+    """
+    backend = lib.backend.get_backend()
+    if restore:
+        saved = backend.save_clipboard()
+    backend.set_clipboard_text(text)
+    backend.press("c-v")
+    backend.pause(PASTE_DELAY)  # Let the application read the clipboard.
+    if restore:
+        backend.restore_clipboard(saved)
+
+
+_sendInput = None  # Created on first use, see _create_send_input().
+
+
+def send_unicode_text(text):
+    """Types text as unicode characters, in a single SendInput call.
+
+    Line breaks are sent as the enter key, which is what applications
+    expect.
+
+    """
+    global _sendInput
+    if _sendInput is None:
+        _sendInput = _create_send_input()
+    if isinstance(text, str):
+        text = text.decode("mbcs")
+    _sendInput(text)
+
+
+def _create_send_input():
+    """Returns a function sending unicode text through SendInput."""
+    import ctypes
+    from ctypes import wintypes
+
+    class KeyboardInput(ctypes.Structure):
+        _fields_ = [("wVk", wintypes.WORD),
+                    ("wScan", wintypes.WORD),
+                    ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD),
+                    ("dwExtraInfo", ctypes.c_size_t)]
+
+    class MouseInput(ctypes.Structure):  # Only needed for the union size.
+        _fields_ = [("dx", wintypes.LONG),
+                    ("dy", wintypes.LONG),
+                    ("mouseData", wintypes.DWORD),
+                    ("dwFlags", wintypes.DWORD),
+                    ("time", wintypes.DWORD),
+                    ("dwExtraInfo", ctypes.c_size_t)]
+
+    class InputUnion(ctypes.Union):
+        _fields_ = [("ki", KeyboardInput), ("mi", MouseInput)]
+
+    class Input(ctypes.Structure):
+        _fields_ = [("type", wintypes.DWORD), ("union", InputUnion)]
+
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_KEYUP = 0x0002
+    KEYEVENTF_UNICODE = 0x0004
+    VK_RETURN = 0x0D
+    user32 = ctypes.windll.user32
+
+    def send_input(text):
+        text = text.replace("\r\n", "\n")
+        inputs = (Input * (len(text) * 2))()
+        for index, character in enumerate(text):
+            for (offset, flags) in ((0, 0), (1, KEYEVENTF_KEYUP)):
+                entry = inputs[index * 2 + offset]
+                entry.type = INPUT_KEYBOARD
+                if character == "\n":
+                    entry.union.ki.wVk = VK_RETURN
+                    entry.union.ki.dwFlags = flags
+                else:
+                    entry.union.ki.wScan = ord(character)
+                    entry.union.ki.dwFlags = flags | KEYEVENTF_UNICODE
+        user32.SendInput(len(inputs), inputs, ctypes.sizeof(Input))
+    return send_input
+
+
+class SCText(BulkText):  # Special Characters Text.
+    def __init__(self, spec=None, *args, **kwargs):
+        self._variables = compile_template(spec)
+        BulkText.__init__(self, spec, *args, **kwargs)
+
+    def _execute(self, data=None):
         """Overrides the normal Text class behavior. To handle dictation of
-        special characters like / . _
+        special characters like / . _ in the variables.
         Unfortunately, I have not found a better place to solve this.
 
         """
-        parts = re.split("\%\([a-z_0-9]+\)s", self._spec)
-        if len(parts) > 2:
-            raise Exception("SCText only supports one variable, yet.")
-        start = len(parts[0])
-        end = len(spec) - len(parts[1])
-        work = spec[start:end]
-        for text, char in specialCharacterTranslations.items():
-            work = work.replace(" %s " % text, char)
-            work = work.replace(" %s" % text, char)
-            work = work.replace("%s " % text, char)
-            work = work.replace("%s" % text, char)
-        spec = parts[0] + work + parts[1]
-        if config.get("aenea.enabled", False) == True:
-            return spec
-        events = []
-        for character in spec:
-            if character in self._specials:
-                typeable = self._specials[character]
-            else:
-                typeable = Keyboard.get_typeable(character)
-            events.extend(typeable.events(self._pause))
-        return events
+        return BulkText._execute(self, translate_variables(data,
+            self._variables))
+
+
+def translate_variables(data, names):
+    """Returns data with the special characters dictated in the values of
+    the named variables translated, like SCText does before formatting its
+    spec. data itself is not changed.
+
+    """
+    if data and names:
+        data = dict(data)
+        for name in names:
+            if name in data:
+                data[name] = translate_special_characters(str(data[name]))
+    return data
 
 normalTextTranslations = {
     "?\\question-mark": "question-mark",
@@ -100,27 +414,81 @@ normalTextTranslations = {
     "=\\equals-sign": "equals-sign",
     "+\\plus-sign": "plus-sign",
     "-\\minus-sign": "minus-sign",
-    "--\dash": "dash",
-    "-\hyphen": "hyphen",
+    "--\\dash": "dash",
+    "-\\hyphen": "hyphen",
 }
+translate_normal_text = compile_translations(normalTextTranslations)
 
 
-class NTText(Text):  # Normal Text Text.
+class NTText(BulkText):  # Normal Text Text.
     def _parse_spec(self, spec):
         """Overrides the normal Text class behavior. To handle dictation of
         special characters like / . _
 
         """
-        for text, char in normalTextTranslations.items():
-            spec = spec.replace(" %s " % text, char)
-            spec = spec.replace(" %s" % text, char)
-            spec = spec.replace("%s " % text, char)
-            spec = spec.replace("%s" % text, char)
-        events = []
-        for character in spec:
-            if character in self._specials:
-                typeable = self._specials[character]
-            else:
-                typeable = Keyboard.get_typeable(character)
-            events.extend(typeable.events(self._pause))
-        return events
+        return BulkText._parse_spec(self, translate_normal_text(spec))
+
+
+def _translate_by_replace(text, translations):
+    """The previous translation, one replace pass per word, for comparison."""
+    for word, char in translations.items():
+        text = text.replace(" %s " % word, char)
+        text = text.replace(" %s" % word, char)
+        text = text.replace("%s " % word, char)
+        text = text.replace("%s" % word, char)
+    return text
+
+
+def _benchmark_translation(count=10000):
+    """Compares the compiled translation with the replace passes, over some
+    typical dictation results.
+
+    """
+    texts = [
+        "my variable",
+        "lib .\\dot text .\\dot py",
+        "path /\\slash to /\\slash file .\\period txt",
+        "self .\\dot items (\\left-parenthesis index )\\right-parenthesis",
+        "git commit -\\hyphen -\\hyphen amend",
+        "user @\\at-sign example .\\dot com",
+        "a long dictated sentence without any special characters at all",
+    ]
+    for text in texts:
+        expected = _translate_by_replace(text, specialCharacterTranslations)
+        if translate_special_characters(text) != expected:
+            print("Differs: %r => %r, expected %r" % (text,
+                translate_special_characters(text), expected))
+    for (name, function) in (
+            ("replace", lambda text: _translate_by_replace(text,
+                specialCharacterTranslations)),
+            ("compiled", translate_special_characters)):
+        start = default_timer()
+        for i in range(count):  # @UnusedVariable
+            for text in texts:
+                function(text)
+        elapsed = default_timer() - start
+        print("%-10s %7.2f us per text" % (name,
+            elapsed / (count * len(texts)) * 1e6))
+
+
+def _benchmark_injection(length=500):
+    """Measures the characters per second of each insertion strategy.
+
+    The text is inserted into the foreground window, so focus an empty
+    editor within three seconds of starting this.
+
+    """
+    time.sleep(3)
+    text = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " *
+        (length // 57 + 1))[:length]
+    for strategy in ("keys", "unicode", "paste"):
+        start = default_timer()
+        inject_text(text, strategy)
+        elapsed = default_timer() - start
+        print("%-8s %10.0f chars/s" % (strategy, length / elapsed))
+        lib.backend.get_backend().press("enter")
+
+
+if __name__ == "__main__":
+    _benchmark_translation()
+    _benchmark_injection()